@@ -1,15 +1,49 @@
 from django.contrib import admin
-from .models import Case, Vegetable 
+from django.utils.html import format_html_join
+from .models import Case, CaseVegetable, Vegetable 
+
+class CaseVegetableInline(admin.TabularInline):
+    model = CaseVegetable
+    fields = ('vegetable', 'weight', 'probability')
+    readonly_fields = ('probability',)
+    autocomplete_fields = ('vegetable',)
+    extra = 1
 
 @admin.register(Case)
 class CaseAdmin(admin.ModelAdmin):
     list_display = ('name', 'price', 'is_active')
     list_filter = ('is_active',)
     search_fields = ('name', 'description')
-    filter_horizontal = ('vegetables',) 
+    inlines = (CaseVegetableInline,)
+    readonly_fields = ('economy',)
+
+    @admin.display(description="Экономика кейса")
+    def economy(self, obj):
+        from .economy import economy_report
+
+        report = economy_report(obj) if obj.pk else None
+        if report is None:
+            return '—'
+
+        rows = [
+            ("Ожидаемый выигрыш (EV)", f"{report['ev']:.2f}"),
+            ("Стандартное отклонение", f"{report['std']:.2f}"),
+        ]
+        if report['rtp'] is not None:
+            rows += [
+                ("Возврат игроку (RTP)", f"{report['rtp']:.2%}"),
+                ("Преимущество заведения", f"{report['house_edge']:.2%}"),
+            ]
+        if 'p_break_even' in report:
+            rows.append((f"Шанс остаться в плюсе за {report['openings']} открытий", f"{report['p_break_even']:.2%}"))
+            rows += [
+                (f"RTP за {report['openings']} открытий, {q}-й перцентиль", f"{rtp:.1%}")
+                for q, rtp in report['rtp_quantiles'].items()
+            ]
+        return format_html_join('', '<div>{}: <b>{}</b></div>', rows)
 
 @admin.register(Vegetable)
 class VegetableAdmin(admin.ModelAdmin):
     list_display = ('name', 'emoji', 'rarity', 'price')
     list_filter = ('rarity',)
-    search_fields = ('name', 'description')
\ No newline at end of file
+    search_fields = ('name', 'description')
@@ -0,0 +1,141 @@
+import functools
+import json
+
+from asgiref.sync import sync_to_async
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.conf import settings
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions
+from rest_framework.request import Request
+from rest_framework.views import exception_handler
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+
+from .catalogue import aget_catalogue, catalogue_response
+from .events import DROPS_CHANNEL, get_broker, ticket_user_id, user_channel
+from .hotstate import aget_state
+from .models import Case
+from .pagination import InventoryCursorPagination
+from .rendering import case_rows, inventory_rows, inventory_values, render_json
+from .views import INVENTORY_TOTALS, inventory_queryset
+
+authentication = JWTStatelessUserAuthentication()
+
+
+def json_response(data, status=200, headers=None):
+    return HttpResponse(render_json(data), content_type='application/json', status=status, headers=headers)
+
+
+def error_response(exc):
+    response = exception_handler(exc, {})
+    headers = {'WWW-Authenticate': authentication.authenticate_header(None)} if response.status_code == 401 else None
+    return json_response(response.data, response.status_code, headers)
+
+
+def authenticated(view):
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            result = authentication.authenticate(request)
+            if result is None:
+                raise exceptions.NotAuthenticated()
+        except exceptions.APIException as exc:
+            return error_response(exc)
+
+        request.user, request.auth = result
+        try:
+            return await view(request, *args, **kwargs)
+        except exceptions.APIException as exc:
+            # E.g. NotFound for a bad cursor, as DRF would answer it.
+            return error_response(exc)
+
+    return wrapper
+
+
+def with_async_reads(async_view, sync_view):
+    """GET/HEAD go to ``async_view``; every other method falls through to the DRF view."""
+    run_sync_view = sync_to_async(sync_view)
+
+    async def view(request, *args, **kwargs):
+        if request.method in ('GET', 'HEAD'):
+            return await async_view(request, *args, **kwargs)
+        return await run_sync_view(request, *args, **kwargs)
+
+    # Labelled like the DRF view in QueryMetricsMiddleware, rather than all as "view".
+    view.cls = sync_view.cls
+    view.actions = getattr(sync_view, 'actions', None)
+    return csrf_exempt(view)
+
+
+async def case_list(request):
+    return catalogue_response(request, await aget_catalogue())
+
+
+async def case_detail(request, pk):
+    try:
+        rows = await sync_to_async(case_rows)(Case.objects.filter(is_active=True, pk=pk))
+    except (TypeError, ValueError, ValidationError):
+        return error_response(Http404())
+    if not rows:
+        return error_response(Http404('No Case matches the given query.'))
+    return json_response(rows[0])
+
+
+@authenticated
+async def inventory_list(request):
+    queryset = inventory_queryset(request.user, request.GET.get('rarity'))
+    if request.GET.get('rarity'):
+        totals = await queryset.aaggregate(**INVENTORY_TOTALS)
+    else:
+        totals = (await aget_state(request.user.pk))['totals']
+
+    # CursorPagination has no async API; only the page fetch leaves the event loop.
+    paginator = InventoryCursorPagination()
+    page = await sync_to_async(paginator.paginate_queryset)(inventory_values(queryset), Request(request))
+
+    data = paginator.get_paginated_response(await sync_to_async(inventory_rows)(page)).data
+    data.update(totals)
+    return json_response(data)
+
+
+@authenticated
+async def profile_list(request):
+    return json_response((await aget_state(request.user.pk))['profile'])
+
+
+@authenticated
+async def user_detail(request):
+    return json_response((await aget_state(request.user.pk))['user'])
+
+
+async def event_stream(subscription):
+    try:
+        yield 'retry: 5000\n\n'
+        async for event in subscription:
+            if event is None:
+                yield ': ping\n\n'
+            else:
+                yield f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+    finally:
+        subscription.close()
+
+
+async def events(request):
+    """
+    Server-sent events: the user's balance and inventory changes and the global
+    epic/legendary drop feed. EventSource cannot send headers, so the stream
+    is opened with a ``?ticket=`` from ``/api/events/ticket/``.
+    """
+    try:
+        user_id = ticket_user_id(request.GET.get('ticket', ''))
+    except signing.BadSignature:
+        return error_response(exceptions.AuthenticationFailed('Недействительный или просроченный билет'))
+
+    response = StreamingHttpResponse(
+        event_stream(get_broker().subscribe([user_channel(user_id), DROPS_CHANNEL], settings.EVENTS_HEARTBEAT)),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
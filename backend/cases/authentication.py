@@ -0,0 +1,13 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+
+
+class UserNotFound(AuthenticationFailed):
+    """
+    A valid token of a user deleted since it was issued. Stateless
+    authentication never loads the user, so this is raised where the
+    profile turns out to be missing, with JWTAuthentication's answer.
+    """
+
+    default_detail = _('User not found')
+    default_code = 'user_not_found'
@@ -0,0 +1,68 @@
+import hashlib
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+
+from .models import Case
+from .rendering import case_rows, render_json
+
+CATALOGUE_CACHE_KEY = 'cases:catalogue'
+CATALOGUE_CACHE_TIMEOUT = 60 * 60
+
+
+def catalogue_queryset():
+    return Case.objects.filter(is_active=True)
+
+
+def catalogue_version():
+    """
+    Fingerprint of the active cases and their ``drop_table_version``, which
+    every edit to a case or its vegetables bumps. Part of the cache key, so
+    a process with its own cache never serves a catalogue edited elsewhere.
+    """
+    versions = list(catalogue_queryset().order_by('pk').values_list('pk', 'drop_table_version'))
+    return hashlib.sha256(repr(versions).encode()).hexdigest()[:16]
+
+
+def render_catalogue():
+    body = render_json(case_rows(catalogue_queryset()))
+    return body, f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+def get_catalogue():
+    """Return ``(body, etag)`` for the rendered list of active cases."""
+    cache_key = f'{CATALOGUE_CACHE_KEY}:{catalogue_version()}'
+    catalogue = cache.get(cache_key)
+
+    if catalogue is None:
+        catalogue = render_catalogue()
+        cache.set(cache_key, catalogue, CATALOGUE_CACHE_TIMEOUT)
+
+    return catalogue
+
+
+async def aget_catalogue():
+    cache_key = f'{CATALOGUE_CACHE_KEY}:{await sync_to_async(catalogue_version)()}'
+    catalogue = await cache.aget(cache_key)
+
+    if catalogue is None:
+        catalogue = await sync_to_async(render_catalogue)()
+        await cache.aset(cache_key, catalogue, CATALOGUE_CACHE_TIMEOUT)
+
+    return catalogue
+
+
+def catalogue_response(request, catalogue):
+    body, etag = catalogue
+
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(body, content_type='application/json')
+
+    response['ETag'] = etag
+    response['Cache-Control'] = 'no-cache'
+    return response
+
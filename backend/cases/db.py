@@ -0,0 +1,2 @@
+# Alias under which import_sqlite opens its (migrated copy of the) source database.
+SOURCE_ALIAS = 'sqlite_import'
@@ -0,0 +1,103 @@
+import random
+from collections import Counter
+
+from .models import CaseVegetable
+
+
+class AliasTable:
+    """Walker/Vose alias table: O(n) to build, O(1) per draw."""
+
+    def __init__(self, weights):
+        n = len(weights)
+        total = sum(weights)
+        scaled = [weight * n / total for weight in weights]
+        small = [i for i, p in enumerate(scaled) if p < 1]
+        large = [i for i, p in enumerate(scaled) if p >= 1]
+
+        self.prob = [1.0] * n
+        self.alias = list(range(n))
+
+        while small and large:
+            s = small.pop()
+            l = large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] = scaled[l] + scaled[s] - 1
+            (small if scaled[l] < 1 else large).append(l)
+
+    def __len__(self):
+        return len(self.prob)
+
+    def index(self, u):
+        u *= len(self.prob)
+        i = int(u)
+        return i if u - i < self.prob[i] else self.alias[i]
+
+    def draw(self, rng=random):
+        return self.index(rng.random())
+
+    def draw_many(self, k, rng=random):
+        index = self.index
+        draw = rng.random
+        return [index(draw()) for _ in range(k)]
+
+
+class DropTable:
+    def __init__(self, version, vegetables, weights):
+        self.version = version
+        self.vegetables = vegetables
+        self.weights = weights
+        self.alias = AliasTable(weights) if vegetables else None
+
+    def __bool__(self):
+        return bool(self.vegetables)
+
+    def sample(self, k=1, rng=random):
+        return [self.vegetables[i] for i in self.alias.draw_many(k, rng)]
+
+    def pick(self, uniforms):
+        """Map floats in [0, 1) to vegetables; deterministic for a given table version."""
+        index = self.alias.index
+        return [self.vegetables[index(u)] for u in uniforms]
+
+
+_tables = {}
+
+
+def build_drop_table(case):
+    """Compile ``case`` from the stored probabilities; entries that cannot drop are left out."""
+    # Ordered by vegetable so a revealed seed maps to the same vegetables when re-derived.
+    entries = list(
+        CaseVegetable.objects.filter(case_id=case.pk, probability__gt=0)
+        .select_related('vegetable')
+        .order_by('vegetable_id')
+    )
+    return DropTable(case.drop_table_version, [entry.vegetable for entry in entries], [entry.probability for entry in entries])
+
+
+def get_drop_table(case):
+    table = _tables.get(case.pk)
+
+    if table is None or table.version != case.drop_table_version:
+        table = build_drop_table(case)
+        _tables[case.pk] = table
+
+    return table
+
+
+def update_drop_chances(case_ids):
+    """Store each entry's normalized probability for ``case_ids``."""
+    entries = list(CaseVegetable.objects.filter(case_id__in=case_ids).select_related('vegetable'))
+
+    totals = Counter()
+    for entry in entries:
+        totals[entry.case_id] += entry.effective_weight
+    for entry in entries:
+        total = totals[entry.case_id]
+        entry.probability = entry.effective_weight / total if total else 0
+
+    CaseVegetable.objects.bulk_update(entries, ['probability'])
+
+
+def clear_drop_tables():
+    _tables.clear()
@@ -0,0 +1,108 @@
+import numpy as np
+from django.core.cache import cache
+
+from .droptables import get_drop_table
+
+ECONOMY_CACHE_TIMEOUT = 24 * 60 * 60
+RTP_QUANTILES = (5, 25, 50, 75, 95)
+PLAYER_CHUNK = 20_000
+
+
+def drop_distribution(case):
+    """``(probabilities, prices)`` of a single opening, in drop-table order."""
+    table = get_drop_table(case)
+    weights = np.asarray(table.weights, dtype=np.float64)
+    prices = np.asarray([veg.price for veg in table.vegetables], dtype=np.int64)
+    return weights / weights.sum(), prices
+
+
+def payout_pmf(probabilities, prices, openings):
+    """
+    Exact distribution of the total payout of ``openings`` independent
+    openings: ``pmf[v]`` is P(total == v). The single-opening pmf is raised to
+    the K-th power in the frequency domain, so this is one FFT regardless of K.
+    """
+    single = np.bincount(prices, weights=probabilities)
+    size = (len(single) - 1) * openings + 1
+    pmf = np.fft.irfft(np.fft.rfft(single, size) ** openings, size)
+    pmf = np.clip(pmf, 0, None)
+    return pmf / pmf.sum()
+
+
+def economy_report(case, openings=100):
+    """
+    EV, variance and return-to-player of ``case``; exact, not sampled.
+    Cached per drop-table version, which changes with the case's price or contents.
+    """
+    cache_key = f'economy:{case.pk}:{case.drop_table_version}:{openings}'
+    report = cache.get(cache_key)
+    if report is not None:
+        return report
+
+    if not get_drop_table(case):
+        return None
+
+    probabilities, prices = drop_distribution(case)
+    ev = float(probabilities @ prices)
+    variance = float(probabilities @ prices.astype(np.float64) ** 2 - ev ** 2)
+
+    report = {
+        'case_price': case.price,
+        'ev': ev,
+        'variance': variance,
+        'std': variance ** 0.5,
+        'rtp': ev / case.price if case.price else None,
+        'house_edge': 1 - ev / case.price if case.price else None,
+        'openings': openings,
+    }
+
+    if case.price and prices.min() >= 0 and prices.max() > 0:
+        pmf = payout_pmf(probabilities, prices, openings)
+        cdf = np.cumsum(pmf)
+        cost = case.price * openings
+        # P(total payout >= total cost): the player ends the session no worse off.
+        report['p_break_even'] = float(pmf[cost:].sum())
+        report['rtp_quantiles'] = {
+            q: int(np.searchsorted(cdf, q / 100)) / cost for q in RTP_QUANTILES
+        }
+
+    cache.set(cache_key, report, ECONOMY_CACHE_TIMEOUT)
+    return report
+
+
+def simulate_players(case, players, openings, budget, seed=None):
+    """
+    Monte Carlo of ``players`` who start with ``budget`` coins and open
+    ``case`` up to ``openings`` times, selling every drop at once. A player
+    stops early when they can no longer afford an opening. Sampled in chunks
+    of ``PLAYER_CHUNK`` players so memory stays bounded.
+    """
+    probabilities, prices = drop_distribution(case)
+    cdf = np.cumsum(probabilities)
+    cdf[-1] = 1.0
+    rng = np.random.default_rng(seed)
+
+    finals = []
+    ruined = 0
+    for start in range(0, players, PLAYER_CHUNK):
+        size = min(PLAYER_CHUNK, players - start)
+        drops = np.searchsorted(cdf, rng.random((size, openings)), side='right')
+        balances = budget + np.cumsum(prices[drops] - case.price, axis=1)
+        before = np.concatenate([np.full((size, 1), budget), balances[:, :-1]], axis=1)
+
+        broke = before < case.price
+        stopped = broke.any(axis=1)
+        first = broke.argmax(axis=1)
+        finals.append(np.where(stopped, before[np.arange(size), first], balances[:, -1]))
+        ruined += int(stopped.sum())
+
+    finals = np.concatenate(finals)
+    return {
+        'players': players,
+        'openings': openings,
+        'budget': budget,
+        'mean_final': float(finals.mean()),
+        'p_ruin': ruined / players,
+        'p_profit': float((finals > budget).mean()),
+        'final_quantiles': {q: float(v) for q, v in zip(RTP_QUANTILES, np.percentile(finals, RTP_QUANTILES))},
+    }
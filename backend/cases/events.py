@@ -0,0 +1,182 @@
+import asyncio
+import json
+import logging
+import threading
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+try:
+    import redis
+    import redis.asyncio
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+DROPS_CHANNEL = 'drops'
+FEED_RARITIES = ('epic', 'legendary')
+TICKET_SALT = 'cases.events.ticket'
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+class InProcessBroker:
+    """
+    Pub/sub for subscribers living in this process.
+
+    Subscribers are asyncio queues on the ASGI event loop, so an idle SSE
+    connection costs a queue, not a thread. ``publish`` is thread-safe and is
+    called from sync views. Several worker processes need ``RedisBroker``.
+    """
+
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self.lock = threading.Lock()
+        self.subscribers = {}
+
+    def publish(self, channel, event):
+        with self.lock:
+            targets = list(self.subscribers.get(channel, ()))
+
+        for loop, queue in targets:
+            try:
+                loop.call_soon_threadsafe(self._put, queue, event)
+            except RuntimeError:
+                # The subscriber's loop is gone; its stream closes the subscription.
+                pass
+
+    @staticmethod
+    def _put(queue, event):
+        if queue.full():
+            # A slow client loses the oldest event rather than growing without bound.
+            queue.get_nowait()
+        queue.put_nowait(event)
+
+    def subscribe(self, channels, heartbeat=None):
+        """Register on ``channels`` right away; must be called from the event loop."""
+        return Subscription(self, channels, heartbeat)
+
+
+class Subscription:
+    """Async iterator over events; yields ``None`` after ``heartbeat`` idle seconds."""
+
+    def __init__(self, broker, channels, heartbeat=None):
+        self.broker = broker
+        self.channels = channels
+        self.heartbeat = heartbeat
+        self.queue = asyncio.Queue(broker.queue_size)
+        self.key = (asyncio.get_running_loop(), self.queue)
+
+        with broker.lock:
+            for channel in channels:
+                broker.subscribers.setdefault(channel, set()).add(self.key)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return await asyncio.wait_for(self.queue.get(), self.heartbeat)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        with self.broker.lock:
+            for channel in self.channels:
+                subscribers = self.broker.subscribers.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(self.key)
+                    if not subscribers:
+                        del self.broker.subscribers[channel]
+
+
+class RedisBroker:
+    """
+    Pub/sub across worker processes through Redis (``EVENTS_REDIS_URL``).
+    ``publish`` sends to Redis; each process runs one listener on its event
+    loop, started by the first subscription, which hands every event to
+    the local subscribers through an ``InProcessBroker``.
+    """
+
+    prefix = 'kabachok:events:'
+
+    def __init__(self):
+        if redis is None:
+            raise ImproperlyConfigured("cases.events.RedisBroker needs the redis package")
+        self.client = redis.Redis.from_url(settings.EVENTS_REDIS_URL)
+        self.local = InProcessBroker()
+        self.listener = None
+
+    def publish(self, channel, event):
+        self.client.publish(self.prefix + channel, json.dumps(event))
+
+    def subscribe(self, channels, heartbeat=None):
+        if self.listener is None or self.listener.done():
+            self.listener = asyncio.get_running_loop().create_task(self.listen())
+        return self.local.subscribe(channels, heartbeat)
+
+    async def listen(self):
+        while True:
+            try:
+                client = redis.asyncio.Redis.from_url(settings.EVENTS_REDIS_URL)
+                async with client.pubsub() as pubsub:
+                    await pubsub.psubscribe(self.prefix + '*')
+                    async for message in pubsub.listen():
+                        if message['type'] == 'pmessage':
+                            channel = message['channel'].decode()[len(self.prefix):]
+                            self.local.publish(channel, json.loads(message['data']))
+            except redis.RedisError:
+                # Events published while disconnected are lost; clients resync on their next request.
+                logger.warning("Lost the connection to the events Redis, reconnecting", exc_info=True)
+                await asyncio.sleep(1)
+
+
+_broker = None
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        _broker = import_string(settings.EVENTS_BACKEND)()
+    return _broker
+
+
+def publish(channel, event):
+    """Publish ``event`` once the current transaction commits."""
+    if settings.EVENTS_ENABLED:
+        transaction.on_commit(lambda: get_broker().publish(channel, event))
+
+
+def issue_ticket(user_id):
+    """
+    A signed ticket that opens the user's stream for ``EVENTS_TICKET_MAX_AGE``
+    seconds. EventSource cannot send headers, and the access token would
+    end up in access logs if it were put in the URL instead.
+    """
+    return signing.dumps(user_id, salt=TICKET_SALT)
+
+
+def ticket_user_id(ticket):
+    """The user id of a valid ticket; raises ``signing.BadSignature`` (or ``SignatureExpired``)."""
+    return signing.loads(ticket, salt=TICKET_SALT, max_age=settings.EVENTS_TICKET_MAX_AGE)
+
+
+def publish_balance(user_id, balance):
+    publish(user_channel(user_id), {'type': 'balance', 'balance': balance})
+
+
+def publish_inventory(user_id, items):
+    """``items`` are the changed rows as ``cases.views.inventory_change`` builds them."""
+    publish(user_channel(user_id), {'type': 'inventory', 'items': items})
+
+
+def publish_drops(username, case, rewards):
+    for vegetable in rewards:
+        if vegetable['rarity'] in FEED_RARITIES:
+            publish(DROPS_CHANNEL, {'type': 'drop', 'username': username, 'case': case.name, 'vegetable': vegetable})
@@ -0,0 +1,142 @@
+import csv
+import io
+import json
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .jobs import enqueue
+from .models import Case, DropEvent, Vegetable
+
+EXPORT_FIELDS = (
+    'created_at', 'user_id', 'case_id', 'case__name', 'vegetable_id', 'vegetable__name', 'vegetable__rarity', 'price', 'nonce',
+)
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+CHUNK_SIZE = 2000
+FLUSH_BYTES = 64 * 1024
+
+
+def record_drops(user, case, rewards, proof=None):
+    """Log an opening's rewards; enqueued in the opening's transaction and written by ``record_drop_batch``."""
+    enqueue('drops.record', {
+        'user_id': user.pk,
+        'case_id': case.pk,
+        'nonce': proof['nonce'] if proof else None,
+        'created_at': timezone.now().isoformat(),
+        'drops': [[vegetable.pk, vegetable.price] for vegetable in rewards],
+    })
+
+
+def existing_ids(model, ids):
+    return set(model.objects.filter(pk__in=ids).values_list('pk', flat=True))
+
+
+def record_drop_batch(payloads):
+    """
+    Job handler: one INSERT for the drops of every opening in the batch.
+    Anything may have been deleted since the opening: drops of a deleted
+    user are skipped, a deleted case or vegetable is stored as NULL.
+    """
+    users = existing_ids(User, {payload['user_id'] for payload in payloads})
+    cases = existing_ids(Case, {payload['case_id'] for payload in payloads})
+    vegetables = existing_ids(Vegetable, {vegetable_id for payload in payloads for vegetable_id, price in payload['drops']})
+
+    DropEvent.objects.bulk_create([
+        DropEvent(
+            user_id=payload['user_id'],
+            case_id=payload['case_id'] if payload['case_id'] in cases else None,
+            vegetable_id=vegetable_id if vegetable_id in vegetables else None,
+            price=price,
+            nonce=None if payload['nonce'] is None else payload['nonce'] + i,
+            created_at=parse_datetime(payload['created_at']),
+        )
+        for payload in payloads if payload['user_id'] in users
+        for i, (vegetable_id, price) in enumerate(payload['drops'])
+    ], batch_size=1000)
+
+
+def export_queryset(user_id=None, case_id=None, since=None, until=None):
+    queryset = DropEvent.objects.all()
+    if user_id is not None:
+        queryset = queryset.filter(user_id=user_id)
+    if case_id is not None:
+        queryset = queryset.filter(case_id=case_id)
+    if since is not None:
+        queryset = queryset.filter(created_at__gte=since)
+    if until is not None:
+        queryset = queryset.filter(created_at__lt=until)
+    return queryset.order_by('created_at', 'id').values_list(*EXPORT_FIELDS)
+
+
+class ExportWriter:
+    """Turns rows into CSV or NDJSON text, buffered into chunks of about ``FLUSH_BYTES``."""
+
+    def __init__(self, output):
+        self.output = output
+        self.buffer = io.StringIO()
+        self.csv = csv.writer(self.buffer) if output == 'csv' else None
+
+    def header(self):
+        if self.csv is not None:
+            self.csv.writerow(EXPORT_FIELDS)
+        return self.flush(force=False)
+
+    def write(self, row):
+        if self.csv is not None:
+            self.csv.writerow([value.isoformat() if i == 0 else value for i, value in enumerate(row)])
+        else:
+            self.buffer.write(json.dumps(
+                dict(zip(EXPORT_FIELDS, row)), ensure_ascii=False, default=lambda value: value.isoformat(),
+            ))
+            self.buffer.write('\n')
+        return self.flush(force=False)
+
+    def flush(self, force=True):
+        if not force and self.buffer.tell() < FLUSH_BYTES:
+            return None
+        chunk = self.buffer.getvalue()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return chunk or None
+
+
+def export_rows(queryset, output):
+    """Stream ``queryset`` through a server-side cursor; memory stays bounded by ``CHUNK_SIZE`` rows."""
+    writer = ExportWriter(output)
+    chunk = writer.header()
+    if chunk:
+        yield chunk
+    for row in queryset.iterator(chunk_size=CHUNK_SIZE):
+        chunk = writer.write(row)
+        if chunk:
+            yield chunk
+    chunk = writer.flush()
+    if chunk:
+        yield chunk
+
+
+async def aexport_rows(queryset, output):
+    """
+    ``export_rows`` for ASGI, so the response is not buffered into a list
+    before sending. The generator is advanced one chunk at a time in the
+    sync thread (``thread_sensitive``), so its cursor stays on the one
+    connection that opened it.
+    """
+    rows = export_rows(queryset, output)
+    while (chunk := await sync_to_async(next)(rows, None)) is not None:
+        yield chunk
+
+
+def prune_drop_events(before, batch_size=10_000):
+    """Delete events older than ``before`` in batches walking the ``created_at`` index; returns the count."""
+    removed = 0
+    while True:
+        ids = list(DropEvent.objects.filter(created_at__lt=before).order_by('created_at').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return removed
+        removed += DropEvent.objects.filter(pk__in=ids).delete()[0]
@@ -0,0 +1,167 @@
+import logging
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F, Sum
+from django.db.models.functions import Coalesce
+
+from .authentication import UserNotFound
+from .models import Inventory, Profile
+from .rendering import datetime_field
+
+logger = logging.getLogger(__name__)
+
+HOTSTATE_CACHE_TIMEOUT = 60 * 60
+STATE_VALUES = (
+    'version', 'balance', 'created_at', 'user_id', 'user__username', 'user__email', 'user__first_name', 'user__last_name',
+    'user__stats__inventory_items', 'user__stats__inventory_value',
+)
+
+
+def enabled():
+    return bool(settings.HOTSTATE_CACHES)
+
+
+def state_key(user_id):
+    return f'hotstate:{user_id}'
+
+
+def state_cache(user_id):
+    """The cache holding ``user_id``'s state; users are spread over ``HOTSTATE_CACHES`` by id."""
+    aliases = settings.HOTSTATE_CACHES
+    return caches[aliases[int(user_id) % len(aliases)]]
+
+
+def recount_totals(user_id):
+    return Inventory.objects.filter(user_id=user_id, quantity__gt=0).aggregate(
+        total_items=Coalesce(Sum('quantity'), 0),
+        total_value=Coalesce(Sum(F('quantity') * F('vegetable__price')), 0),
+    )
+
+
+def load_state(user_id, recount=False):
+    """
+    The user's state from the database in one query, or None without a
+    profile: ``profile`` and ``user`` as ``ProfileSerializer`` and
+    ``UserSerializer`` return them, ``totals`` as ``INVENTORY_TOTALS`` of the
+    whole inventory (kept in ``UserStats`` by ``cases.stats``).
+
+    ``UserStats`` only follows the changes made through ``cases.stats``; code
+    changing ``Inventory`` rows directly (``Inventory.objects.update`` and the
+    like) must call ``rebuild_user_stats``, which also drops the cached
+    states. ``recount`` sums the inventory instead, at the cost of a second
+    query, so that the checks below notice when that was missed.
+    """
+    values = Profile.objects.filter(user_id=user_id).values(*STATE_VALUES).first()
+    if values is None:
+        return None
+
+    profile = {'balance': values['balance'], 'created_at': datetime_field.to_representation(values['created_at'])}
+    return {
+        'version': values['version'],
+        'profile': profile,
+        'user': {
+            'id': values['user_id'],
+            'username': values['user__username'],
+            'email': values['user__email'],
+            'first_name': values['user__first_name'],
+            'last_name': values['user__last_name'],
+            'profile': profile,
+        },
+        'totals': recount_totals(user_id) if recount else {
+            'total_items': values['user__stats__inventory_items'] or 0,
+            'total_value': values['user__stats__inventory_value'] or 0,
+        },
+    }
+
+
+def get_state(user_id):
+    """
+    Read-through: the cached state, loaded on a miss. With ``HOTSTATE_CHECK``
+    every hit is compared with the database as well, totals recounted from
+    the inventory; a differing entry is logged and dropped, and the database
+    value is returned. Raises ``UserNotFound`` without a profile.
+    """
+    if not enabled():
+        state = load_state(user_id)
+    else:
+        cache = state_cache(user_id)
+        state = cache.get(state_key(user_id))
+        if state is None:
+            state = load_state(user_id)
+            if state is not None:
+                # add(), not set(): a write committed since the load may have stored a newer version.
+                cache.add(state_key(user_id), state, HOTSTATE_CACHE_TIMEOUT)
+        elif settings.HOTSTATE_CHECK:
+            cached, state = state, load_state(user_id, recount=True)
+            if cached != state:
+                logger.warning("Hot state of user %s differs from the database: cached %r, stored %r", user_id, cached, state)
+                cache.delete(state_key(user_id))
+
+    if state is None:
+        raise UserNotFound
+    return state
+
+
+async def aget_state(user_id):
+    if enabled() and not settings.HOTSTATE_CHECK:
+        state = await state_cache(user_id).aget(state_key(user_id))
+        if state is not None:
+            return state
+    return await sync_to_async(get_state)(user_id)
+
+
+def refresh_state(user_id):
+    """
+    Write-through, once a balance change has committed: cache the state as
+    stored now unless a newer version is cached already. The compare and the
+    set are two cache calls, so two writes refreshing at the same moment can
+    leave the older one cached until the user's next write or the timeout.
+    """
+    if not enabled():
+        return
+
+    cache = state_cache(user_id)
+    state = load_state(user_id)
+    if state is None:
+        cache.delete(state_key(user_id))
+        return
+
+    cached = cache.get(state_key(user_id))
+    if cached is None or cached['version'] < state['version']:
+        cache.set(state_key(user_id), state, HOTSTATE_CACHE_TIMEOUT)
+
+
+def state_changed(user_id):
+    """Refresh the user's cached state when the current transaction commits; call after changing the balance."""
+    if enabled():
+        # robust: the write has committed by then, a cache error must not fail the request.
+        transaction.on_commit(lambda: refresh_state(user_id), robust=True)
+
+
+def invalidate_states(user_ids):
+    """Drop cached states changed without a balance change (profile fields, rebuilt stats)."""
+    if not enabled():
+        return
+
+    shards = defaultdict(list)
+    for user_id in user_ids:
+        shards[state_cache(user_id)].append(state_key(user_id))
+    for cache, keys in shards.items():
+        cache.delete_many(keys)
+
+
+def stale_states(user_ids):
+    """Ids of users whose cached state differs from the database (totals recounted); missing entries are not stale."""
+    if not enabled():
+        return []
+
+    stale = []
+    for user_id in user_ids:
+        cached = state_cache(user_id).get(state_key(user_id))
+        if cached is not None and cached != load_state(user_id, recount=True):
+            stale.append(user_id)
+    return stale
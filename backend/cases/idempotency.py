@@ -0,0 +1,96 @@
+import functools
+import hashlib
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyRecord
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 100
+
+
+def request_hash(request):
+    digest = hashlib.sha256(f'{request.method} {request.path}\n'.encode())
+    digest.update(request.body)
+    return digest.hexdigest()
+
+
+def claim(user, key, fingerprint):
+    """
+    Insert the record for ``key``, or return the existing one. Inside the
+    caller's transaction the new row stays uncommitted, so a concurrent
+    duplicate blocks on the unique index until this request has finished.
+    """
+    try:
+        with transaction.atomic():
+            return IdempotencyRecord.objects.create(user_id=user.pk, key=key, request_hash=fingerprint), True
+    except IntegrityError:
+        pass
+
+    existing = IdempotencyRecord.objects.get(user_id=user.pk, key=key)
+    if existing.created_at < timezone.now() - settings.IDEMPOTENCY_KEY_TTL:
+        # Expired but not purged yet: treat the key as new.
+        existing.delete()
+        return IdempotencyRecord.objects.create(user_id=user.pk, key=key, request_hash=fingerprint), True
+    return existing, False
+
+
+def idempotent(view):
+    """
+    Make a DRF action replay-safe under the ``Idempotency-Key`` header: the
+    first response is stored and returned again for the same key, without
+    running the view. Requests without the header are unaffected.
+    """
+
+    @functools.wraps(view)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view(self, request, *args, **kwargs)
+
+        if len(key) > MAX_KEY_LENGTH:
+            return Response({
+                'success': False,
+                'message': f'{HEADER} не длиннее {MAX_KEY_LENGTH} символов'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        fingerprint = request_hash(request)
+
+        with transaction.atomic():
+            record, created = claim(request.user, key, fingerprint)
+
+            if created:
+                response = view(self, request, *args, **kwargs)
+                if response.status_code >= 500:
+                    # Let the client retry a server error under the same key.
+                    record.delete()
+                else:
+                    record.status_code = response.status_code
+                    record.response_body = response.data
+                    record.save(update_fields=['status_code', 'response_body'])
+                return response
+
+        if record.request_hash != fingerprint:
+            return Response({
+                'success': False,
+                'message': f'{HEADER} уже использован для другого запроса'
+            }, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+        return Response(record.response_body, status=record.status_code, headers={'Idempotent-Replayed': 'true'})
+
+    return wrapper
+
+
+def purge_expired(batch_size=1000):
+    """Delete records older than ``IDEMPOTENCY_KEY_TTL``; returns how many were removed."""
+    cutoff = timezone.now() - settings.IDEMPOTENCY_KEY_TTL
+    removed = 0
+    while True:
+        ids = list(IdempotencyRecord.objects.filter(created_at__lt=cutoff).values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return removed
+        removed += IdempotencyRecord.objects.filter(pk__in=ids).delete()[0]
@@ -0,0 +1,148 @@
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# Job kind -> handler taking the list of payloads of a batch; runs in one transaction per kind.
+HANDLERS = {
+    'drops.record': 'cases.history.record_drop_batch',
+}
+MAX_BACKOFF = 60 * 60
+LEASE = timedelta(minutes=5)
+
+
+def get_handler(kind):
+    return import_string(HANDLERS[kind])
+
+
+class DatabaseQueue:
+    """
+    Jobs are rows written in the caller's transaction, so they exist only if
+    the request commits, and are processed in batches by ``run_worker``.
+    """
+
+    def enqueue(self, kind, payload):
+        Job.objects.create(kind=kind, payload=payload)
+
+
+class ThreadPoolQueue:
+    """
+    For development without a worker: each job runs in a thread of this
+    process once the caller commits. Nothing is stored, so a crash loses it.
+    """
+
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(max_workers=settings.JOBS_THREADS, thread_name_prefix='jobs')
+
+    def enqueue(self, kind, payload):
+        transaction.on_commit(lambda: self.executor.submit(self.run, kind, payload))
+
+    @staticmethod
+    def run(kind, payload):
+        close_old_connections()
+        try:
+            with transaction.atomic():
+                get_handler(kind)([payload])
+        except Exception:
+            logger.exception("Job %s failed", kind)
+        finally:
+            close_old_connections()
+
+
+_queue = None
+
+
+def get_queue():
+    global _queue
+    if _queue is None:
+        _queue = import_string(settings.JOBS_BACKEND)()
+    return _queue
+
+
+def enqueue(kind, payload):
+    """Schedule ``HANDLERS[kind]`` to run with ``payload``, which must be JSON-serializable."""
+    if kind not in HANDLERS:
+        raise KeyError(f"Unknown job kind {kind!r}")
+    get_queue().enqueue(kind, payload)
+
+
+def claim_jobs(batch_size):
+    """
+    Lease up to ``batch_size`` due jobs: their ``run_at`` moves ``LEASE``
+    ahead, so other workers skip them, and they come back if this one dies.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        # skip_locked lets several workers share the table on databases with row locks.
+        jobs = list(
+            Job.objects.filter(failed_at__isnull=True, run_at__lte=now)
+            .order_by('run_at', 'id')
+            .select_for_update(skip_locked=True)[:batch_size]
+        )
+        Job.objects.filter(pk__in=[job.pk for job in jobs]).update(run_at=now + LEASE)
+    return jobs
+
+
+def run_batch(kind, jobs):
+    """
+    Run the handler and delete the jobs in a transaction of their own;
+    returns the exception if that failed, including constraint checks
+    deferred to the COMMIT.
+    """
+    try:
+        with transaction.atomic():
+            get_handler(kind)([job.payload for job in jobs])
+            Job.objects.filter(pk__in=[job.pk for job in jobs]).delete()
+    except Exception as exc:
+        return exc
+    return None
+
+
+def run_jobs(batch_size=500):
+    """
+    Claim up to ``batch_size`` due jobs and run them, one handler call per
+    kind. When a batch fails its jobs are retried one by one, so a bad
+    payload holds back only itself; a failing job is retried with
+    exponential backoff until ``JOBS_MAX_ATTEMPTS``. Must run outside a
+    transaction; returns how many jobs were claimed.
+    """
+    jobs = claim_jobs(batch_size)
+
+    batches = defaultdict(list)
+    for job in jobs:
+        batches[job.kind].append(job)
+
+    failed = []
+    for kind, batch in batches.items():
+        exc = run_batch(kind, batch)
+        if exc is None:
+            continue
+        logger.error("%d %s jobs failed", len(batch), kind, exc_info=exc)
+
+        if len(batch) == 1:
+            errors = {batch[0]: exc}
+        else:
+            errors = {job: run_batch(kind, [job]) for job in batch}
+        now = timezone.now()
+        for job, error in errors.items():
+            if error is None:
+                continue
+            job.attempts += 1
+            job.last_error = repr(error)
+            if job.attempts >= settings.JOBS_MAX_ATTEMPTS:
+                job.failed_at = now
+            else:
+                job.run_at = now + timedelta(seconds=min(2 ** job.attempts, MAX_BACKOFF))
+            failed.append(job)
+
+    Job.objects.bulk_update(failed, ['attempts', 'last_error', 'run_at', 'failed_at'])
+    return len(jobs)
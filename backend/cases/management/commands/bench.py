@@ -0,0 +1,406 @@
+import http.client
+import json
+import math
+import os
+import secrets
+import subprocess
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager, nullcontext
+from types import SimpleNamespace
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import Coalesce
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from cases.hotstate import stale_states
+from cases.models import Case, Inventory, Job, Profile, Vegetable
+from cases.serializers import CustomTokenObtainPairSerializer
+from cases.stats import record_deposit, stale_user_stats
+from cases.throttling import TokenBucketThrottle
+from cases.wallet import credit
+
+PREFIX = 'bench_'
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE')
+
+
+class InProcessTransport:
+    """Drives the DRF views through the test client and counts queries and write statements."""
+
+    name = 'in-process'
+
+    def __init__(self):
+        self.local = threading.local()
+        host = next((h.lstrip('.') for h in settings.ALLOWED_HOSTS if h not in ('*', '')), 'localhost')
+        self.host = host
+
+    def request(self, method, path, token, data=None):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = APIClient(raise_request_exception=False, HTTP_HOST=self.host)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = client.generic(
+                method, path,
+                data=json.dumps(data) if data is not None else '',
+                content_type='application/json',
+                HTTP_AUTHORIZATION=f'Bearer {token}',
+            )
+        body = json.loads(response.content) if response.content and response['Content-Type'].startswith('application/json') else None
+        writes = sum(1 for query in queries.captured_queries if query['sql'].lstrip().upper().startswith(WRITE_STATEMENTS))
+        return response.status_code, body, len(queries), writes
+
+    def close(self):
+        connection.close()
+
+
+class HttpTransport:
+    """Drives a running server (e.g. a local gunicorn) over keep-alive HTTP connections."""
+
+    name = 'http'
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.scheme = parts.scheme
+        self.netloc = parts.netloc
+        self.prefix = parts.path.rstrip('/')
+        self.local = threading.local()
+
+    def connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            cls = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+            conn = self.local.conn = cls(self.netloc, timeout=30)
+        return conn
+
+    def request(self, method, path, token, data=None):
+        body = json.dumps(data) if data is not None else None
+        headers = {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'}
+        try:
+            conn = self.connection()
+            conn.request(method, self.prefix + path, body=body, headers=headers)
+            response = conn.getresponse()
+        except (http.client.HTTPException, OSError):
+            self.local.conn = None
+            raise
+        content = response.read()
+        is_json = (response.getheader('Content-Type') or '').startswith('application/json')
+        return response.status, json.loads(content) if content and is_json else None, None, None
+
+    def close(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is not None:
+            conn.close()
+        connection.close()
+
+
+@contextmanager
+def throwaway_database(keep=False):
+    """
+    Run against a freshly migrated database instead of the configured one: a
+    temporary SQLite file, or ``bench_<name>`` on the same server. Cache keys
+    get the same prefix, so shared caches keep the real users' entries.
+    """
+    test = connection.settings_dict['TEST']
+    if connection.vendor == 'sqlite':
+        test['NAME'] = os.path.join(tempfile.gettempdir(), f'{PREFIX}{os.getpid()}.sqlite3')
+    else:
+        test['NAME'] = f"{PREFIX}{connection.settings_dict['NAME']}"
+
+    old_name = connection.settings_dict['NAME']
+    name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    caches = {alias: {**config, 'KEY_PREFIX': config.get('KEY_PREFIX', '') + PREFIX} for alias, config in settings.CACHES.items()}
+    try:
+        with override_settings(CACHES=caches):
+            yield name
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=keep)
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+class Command(BaseCommand):
+    help = "Нагрузочный тест горячих эндпоинтов (open, sell, deposit и чтение)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--cases', type=int, default=3)
+        parser.add_argument('--vegetables', type=int, default=20)
+        parser.add_argument('--requests', type=int, default=200, help="Запросов на каждый эндпоинт")
+        parser.add_argument('--threads', type=int, default=4)
+        parser.add_argument('--batch', type=int, default=10, help="Размер пачки для open-batch")
+        parser.add_argument('--url', help="Адрес запущенного сервера, например http://127.0.0.1:8000")
+        parser.add_argument('--output', help="Файл для JSON-результата")
+        parser.add_argument('--keep', action='store_true', help="Не удалять тестовые данные")
+        parser.add_argument(
+            '--configured-database', action='store_true',
+            help="Создавать тестовые данные в настроенной базе, а не во временной (нужно для --url)",
+        )
+        parser.add_argument('--throttle', action='store_true', help="Не отключать лимиты запросов в режиме in-process")
+
+    def handle(self, *args, **options):
+        if options['url'] and not options['configured_database']:
+            # The server only sees the data in its own database.
+            raise CommandError("С --url тестовые данные создаются в базе сервера: подтвердите это флагом --configured-database")
+
+        if options['configured_database']:
+            self.bench(options)
+            return
+
+        with throwaway_database(keep=options['keep']) as name:
+            self.bench(options)
+        if options['keep']:
+            self.stdout.write(f"Временная база сохранена: {name}")
+
+    def bench(self, options):
+        self.opened = Counter()
+        self.sold = Counter()
+        self.lock = threading.Lock()
+        self.users, self.cases, self.vegetables = [], [], []
+
+        transport = HttpTransport(options['url']) if options['url'] else InProcessTransport()
+
+        try:
+            self.seed(options['users'], options['cases'], options['vegetables'])
+
+            throttle_us = self.measure_throttle()
+            self.stdout.write(f"throttle check: {throttle_us:.2f} µs")
+
+            # A running server applies its own limits; in-process they would only measure the 429 path.
+            limits = nullcontext() if options['throttle'] or options['url'] else override_settings(THROTTLE_BUCKETS={})
+            results = {}
+            with limits:
+                for name, method, make_request in self.scenarios(options['batch']):
+                    results[name] = self.run_phase(transport, method, make_request, options['requests'], options['threads'])
+                    self.report(name, results[name])
+
+            invariants = self.check_invariants()
+            self.stdout.write(f"invariants: {json.dumps(invariants)}")
+
+            output = {
+                'meta': {
+                    'commit': self.commit(),
+                    'timestamp': timezone.now().isoformat(),
+                    'transport': transport.name,
+                    'database': connection.vendor,
+                    'options': {k: options[k] for k in ('users', 'cases', 'vegetables', 'requests', 'threads', 'batch', 'url', 'throttle')},
+                },
+                'endpoints': results,
+                'throttle_check_us': throttle_us,
+                'invariants': invariants,
+            }
+            if options['output']:
+                with open(options['output'], 'w') as f:
+                    json.dump(output, f, indent=2)
+                self.stdout.write(self.style.SUCCESS(f"Результат записан в {options['output']}"))
+        finally:
+            if not options['keep']:
+                self.cleanup()
+
+    def seed(self, users, cases, vegetables):
+        # Names unique per run: a previous --keep run may have left its data behind.
+        prefix = f'{PREFIX}{secrets.token_hex(3)}_'
+        rarities = list(Vegetable.RARITY_WEIGHTS)
+        veg_objects = Vegetable.objects.bulk_create([
+            Vegetable(name=f'{prefix}veg_{i}', rarity=rarities[i % len(rarities)], price=5 + i)
+            for i in range(vegetables)
+        ])
+        self.vegetables = [vegetable.pk for vegetable in veg_objects]
+        for i in range(cases):
+            case = Case.objects.create(name=f'{prefix}case_{i}', price=20)
+            case.vegetables.set(veg_objects)
+            self.cases.append(case.pk)
+
+        for i in range(users):
+            user = User.objects.create_user(f'{prefix}user_{i}', password=None)
+            with transaction.atomic():
+                credit(user, 10_000_000, 'deposit')
+                record_deposit(user.pk, 10_000_000)
+            token = str(CustomTokenObtainPairSerializer.get_token(user).access_token)
+            self.users.append((user, token))
+
+    def measure_throttle(self, checks=100_000):
+        """Average cost in microseconds of one TokenBucketThrottle check (user and global bucket)."""
+        throttle = TokenBucketThrottle()
+        request = SimpleNamespace(user=self.users[0][0])
+        view = SimpleNamespace(action='bench', throttle_scopes={'bench': 'bench'})
+        unlimited = (1e9, 1e9)
+
+        with override_settings(THROTTLE_BUCKETS={'bench': {'user': unlimited, 'global': unlimited}}):
+            started = time.perf_counter()
+            for _ in range(checks):
+                throttle.allow_request(request, view)
+            elapsed = time.perf_counter() - started
+        return elapsed / checks * 1e6
+
+    def cleanup(self):
+        """Delete only what ``seed`` created, and the drop records its openings left queued."""
+        user_ids = [user.pk for user, token in self.users]
+        Job.objects.filter(kind='drops.record', payload__user_id__in=user_ids).delete()
+        User.objects.filter(pk__in=user_ids).delete()
+        Case.objects.filter(pk__in=self.cases).delete()
+        Vegetable.objects.filter(pk__in=self.vegetables).delete()
+
+    def scenarios(self, batch):
+        rarities = list(Vegetable.RARITY_WEIGHTS)
+
+        def case_path(i, suffix=''):
+            return f'/api/cases/{self.cases[i % len(self.cases)]}/{suffix}'
+
+        def open_case(i, user):
+            return case_path(i, 'open/'), None, lambda body: self.count(self.opened, user, 1)
+
+        def open_batch(i, user):
+            return case_path(i, 'open-batch/'), {'count': batch}, lambda body: self.count(self.opened, user, len(body['rewards']))
+
+        def sell(i, user):
+            pk = Inventory.objects.filter(user=user, quantity__gt=0).values_list('id', flat=True).first()
+            return f'/api/inventory/{pk}/sell/', None, lambda body: self.count(self.sold, user, 1)
+
+        def sell_rarity(i, user):
+            rarity = rarities[i // len(self.users) % len(rarities)]
+            return '/api/inventory/sell-batch/', {'rarity': rarity}, lambda body: self.count(self.sold, user, body['sold'])
+
+        return [
+            ('cases.list', 'GET', lambda i, user: ('/api/cases/', None, None)),
+            ('cases.retrieve', 'GET', lambda i, user: (case_path(i), None, None)),
+            ('profile.list', 'GET', lambda i, user: ('/api/profile/', None, None)),
+            ('profile.deposit', 'POST', lambda i, user: ('/api/profile/deposit/', {'amount': 100}, None)),
+            ('cases.open', 'POST', open_case),
+            ('cases.open_batch', 'POST', open_batch),
+            ('inventory.list', 'GET', lambda i, user: ('/api/inventory/', None, None)),
+            ('inventory.sell', 'POST', sell),
+            # Sells whole stacks down to zero, then drops refill them.
+            ('inventory.sell_batch', 'POST', sell_rarity),
+            ('cases.open_batch.refill', 'POST', open_batch),
+        ]
+
+    def count(self, counter, user, n):
+        with self.lock:
+            counter[user.pk] += n
+
+    def run_phase(self, transport, method, make_request, total, threads):
+        samples = []
+        statuses = Counter()
+        next_index = iter(range(total))
+        index_lock = threading.Lock()
+
+        def worker():
+            try:
+                while True:
+                    with index_lock:
+                        i = next(next_index, None)
+                    if i is None:
+                        return
+                    user, token = self.users[i % len(self.users)]
+                    path, data, on_success = make_request(i, user)
+
+                    started = time.perf_counter()
+                    try:
+                        status, body, queries, writes = transport.request(method, path, token, data)
+                    except Exception:
+                        status, body, queries, writes = 'exception', None, None, None
+                    elapsed = time.perf_counter() - started
+
+                    if isinstance(status, int) and status < 300 and on_success is not None:
+                        on_success(body)
+                    with self.lock:
+                        samples.append((elapsed, queries, writes))
+                        statuses[status] += 1
+            finally:
+                transport.close()
+
+        started = time.perf_counter()
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        wall = time.perf_counter() - started
+
+        latencies = sorted(elapsed * 1000 for elapsed, queries, writes in samples)
+        queries = [q for elapsed, q, w in samples if q is not None]
+        writes = [w for elapsed, q, w in samples if w is not None]
+        return {
+            'requests': len(samples),
+            'statuses': {str(k): v for k, v in statuses.items()},
+            'errors': sum(v for k, v in statuses.items() if not isinstance(k, int) or k >= 500),
+            'rps': round(len(samples) / wall, 1) if wall else None,
+            'p50_ms': percentile(latencies, 50),
+            'p95_ms': percentile(latencies, 95),
+            'p99_ms': percentile(latencies, 99),
+            'queries_avg': round(sum(queries) / len(queries), 2) if queries else None,
+            'queries_max': max(queries) if queries else None,
+            'writes_avg': round(sum(writes) / len(writes), 2) if writes else None,
+        }
+
+    def report(self, name, result):
+        fmt = lambda v: '-' if v is None else f'{v:.1f}'
+        self.stdout.write(
+            f"{name:<18} {result['requests']:>6} req {fmt(result['rps']):>8} rps  "
+            f"p50 {fmt(result['p50_ms'])} p95 {fmt(result['p95_ms'])} p99 {fmt(result['p99_ms'])} ms  "
+            f"queries {fmt(result['queries_avg'])} (max {result['queries_max']}) writes {fmt(result['writes_avg'])}  "
+            f"errors {result['errors']}  {result['statuses']}"
+        )
+
+    def check_invariants(self):
+        user_ids = [user.pk for user, token in self.users]
+
+        ledger_mismatches = (
+            Profile.objects.filter(user_id__in=user_ids)
+            .annotate(ledger_total=Coalesce(Sum('user__ledger__amount'), 0))
+            .exclude(balance=F('ledger_total'))
+            .count()
+        )
+        negative_balances = Profile.objects.filter(user_id__in=user_ids, balance__lt=0).count()
+        negative_quantities = Inventory.objects.filter(user_id__in=user_ids, quantity__lt=0).count()
+
+        held = dict(
+            Inventory.objects.filter(user_id__in=user_ids)
+            .values_list('user_id')
+            .annotate(total=Sum('quantity'))
+        )
+        inventory_mismatches = defaultdict(dict)
+        for user_id in user_ids:
+            expected = self.opened[user_id] - self.sold[user_id]
+            if held.get(user_id, 0) != expected:
+                inventory_mismatches[user_id] = {'expected': expected, 'actual': held.get(user_id, 0)}
+
+        with transaction.atomic():
+            missing, changed = stale_user_stats(user_ids)
+        stats_mismatches = len(missing) + len(changed)
+        hotstate_mismatches = len(stale_states(user_ids))
+
+        return {
+            'ledger_mismatches': ledger_mismatches,
+            'negative_balances': negative_balances,
+            'negative_quantities': negative_quantities,
+            'inventory_mismatches': len(inventory_mismatches),
+            'stats_mismatches': stats_mismatches,
+            'hotstate_mismatches': hotstate_mismatches,
+            'violations': (
+                ledger_mismatches + negative_balances + negative_quantities + len(inventory_mismatches)
+                + stats_mismatches + hotstate_mismatches
+            ),
+        }
+
+    def commit(self):
+        try:
+            return subprocess.check_output(
+                ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR, stderr=subprocess.DEVNULL, text=True,
+            ).strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from cases.economy import economy_report, simulate_players
+from cases.models import Case
+
+
+class Command(BaseCommand):
+    help = "Отчёт по экономике кейсов: EV, дисперсия, RTP и Монте-Карло балансов игроков"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--case', type=int, action='append', dest='cases', help="id кейса (можно несколько)")
+        parser.add_argument('--openings', type=int, default=100, help="Открытий за сессию игрока")
+        parser.add_argument('--players', type=int, default=0, help="Симулировать столько игроков (0 — без симуляции)")
+        parser.add_argument('--budget', type=int, help="Стартовый баланс игрока (по умолчанию 10 цен кейса)")
+        parser.add_argument('--seed', type=int, help="Сид для воспроизводимой симуляции")
+
+    def handle(self, *args, cases, openings, players, budget, seed, **options):
+        queryset = Case.objects.filter(pk__in=cases) if cases else Case.objects.filter(is_active=True)
+
+        for case in queryset.order_by('pk'):
+            report = economy_report(case, openings)
+            if report is None:
+                self.stdout.write(f"{case.name}: в кейсе нет овощей")
+                continue
+
+            self.stdout.write(f"{case.name} (id {case.pk}, цена {case.price})")
+            self.stdout.write(f"  EV {report['ev']:.2f}, σ {report['std']:.2f}")
+            if report['rtp'] is not None:
+                self.stdout.write(f"  RTP {report['rtp']:.2%}, преимущество заведения {report['house_edge']:.2%}")
+            if 'p_break_even' in report:
+                quantiles = ', '.join(f"p{q} {rtp:.1%}" for q, rtp in report['rtp_quantiles'].items())
+                self.stdout.write(f"  за {openings} открытий: в плюсе {report['p_break_even']:.2%}, RTP {quantiles}")
+
+            if players:
+                started = time.perf_counter()
+                result = simulate_players(case, players, openings, budget or case.price * 10, seed)
+                elapsed = time.perf_counter() - started
+                quantiles = ', '.join(f"p{q} {value:.0f}" for q, value in result['final_quantiles'].items())
+                self.stdout.write(
+                    f"  {players} игроков с балансом {result['budget']} за {elapsed:.2f} с: "
+                    f"разорились {result['p_ruin']:.2%}, в плюсе {result['p_profit']:.2%}, "
+                    f"средний итог {result['mean_final']:.1f}; {quantiles}"
+                )
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from cases.models import Inventory
+
+
+class Command(BaseCommand):
+    help = "Удаляет строки инвентаря, проданные до нуля (их оставляет продажа, чтобы не пересоздавать при выпадении)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10_000)
+
+    def handle(self, *args, batch_size, **options):
+        removed = 0
+        while True:
+            ids = list(Inventory.objects.filter(quantity=0).values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            # quantity=0 is checked again at delete time: a drop may have refilled the row since.
+            removed += Inventory.objects.filter(pk__in=ids, quantity=0).delete()[0]
+            if len(ids) < batch_size:
+                break
+        self.stdout.write(self.style.SUCCESS(f"Удалено пустых строк: {removed}"))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from cases.history import EXPORT_FORMATS, export_queryset, export_rows
+
+
+def timestamp(value):
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError(value)
+    return parsed
+
+
+class Command(BaseCommand):
+    help = "Выгружает историю выпадений в CSV или NDJSON, не загружая её в память целиком"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help="Файл для выгрузки (по умолчанию stdout)")
+        parser.add_argument('--format', dest='output_format', choices=list(EXPORT_FORMATS), default='csv')
+        parser.add_argument('--since', type=timestamp, help="С момента (ISO 8601)")
+        parser.add_argument('--until', type=timestamp, help="До момента, не включая (ISO 8601)")
+        parser.add_argument('--user', type=int, help="id пользователя")
+        parser.add_argument('--case', type=int, help="id кейса")
+
+    def handle(self, *args, output, output_format, since, until, user, case, **options):
+        if since and until and since >= until:
+            raise CommandError("--since должен быть раньше --until")
+
+        queryset = export_queryset(user_id=user, case_id=case, since=since, until=until)
+        if not output:
+            for chunk in export_rows(queryset, output_format):
+                self.stdout.write(chunk, ending='')
+            return
+
+        with open(output, 'w', encoding='utf-8', newline='') as stream:
+            for chunk in export_rows(queryset, output_format):
+                stream.write(chunk)
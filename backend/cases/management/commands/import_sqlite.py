@@ -0,0 +1,93 @@
+import os
+import sqlite3
+import tempfile
+from contextlib import closing, contextmanager
+
+from django.apps import apps
+from django.contrib.auth.models import Permission, User
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.core.serializers import sort_dependencies
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from cases.db import SOURCE_ALIAS
+
+
+@contextmanager
+def source_database(path):
+    """
+    A migrated copy of the SQLite file at ``path`` as the ``SOURCE_ALIAS``
+    database, for the duration of the block. The file itself is only read,
+    so a database of any earlier version can be imported as it is.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        copy = os.path.join(directory, 'source.sqlite3')
+        try:
+            with closing(sqlite3.connect(f'file:{path}?mode=ro', uri=True)) as source, closing(sqlite3.connect(copy)) as target:
+                source.backup(target)
+        except sqlite3.Error as exc:
+            raise CommandError(f"Не удалось прочитать {path}: {exc}")
+
+        connections.settings[SOURCE_ALIAS] = connections.configure_settings({
+            DEFAULT_DB_ALIAS: connections.settings[DEFAULT_DB_ALIAS],
+            SOURCE_ALIAS: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': copy},
+        })[SOURCE_ALIAS]
+        try:
+            call_command('migrate', database=SOURCE_ALIAS, verbosity=0)
+            yield connections[SOURCE_ALIAS]
+        finally:
+            connections[SOURCE_ALIAS].close()
+            del connections[SOURCE_ALIAS]
+            del connections.settings[SOURCE_ALIAS]
+
+
+class Command(BaseCommand):
+    help = "Переносит все данные из файла db.sqlite3 в текущую базу (например, PostgreSQL из DATABASE_URL)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Путь к существующему db.sqlite3")
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, path, batch_size, **options):
+        if User.objects.exists():
+            raise CommandError("Целевая база не пуста: выполните импорт сразу после migrate")
+
+        app_list = [(app_config, None) for app_config in apps.get_app_configs() if app_config.models_module]
+        models = [model for model in sort_dependencies(app_list) if model._meta.managed and not model._meta.proxy]
+        models += [
+            model for model in apps.get_models(include_auto_created=True)
+            if model._meta.auto_created and model._meta.managed
+        ]
+
+        with source_database(path), transaction.atomic():
+            # migrate has already created these rows; take the source's ids instead.
+            Permission.objects.all().delete()
+            ContentType.objects.all().delete()
+
+            for model in models:
+                copied = self.copy(model, batch_size)
+                self.stdout.write(f"{model._meta.label}: {copied}")
+
+            connection = connections[DEFAULT_DB_ALIAS]
+            with connection.cursor() as cursor:
+                for sql in connection.ops.sequence_reset_sql(no_style(), models):
+                    cursor.execute(sql)
+
+        ContentType.objects.clear_cache()
+        self.stdout.write(self.style.SUCCESS("Импорт завершён"))
+
+    def copy(self, model, batch_size):
+        copied = 0
+        batch = []
+        for obj in model._base_manager.using(SOURCE_ALIAS).order_by('pk').iterator(chunk_size=batch_size):
+            batch.append(obj)
+            if len(batch) >= batch_size:
+                model._base_manager.bulk_create(batch)
+                copied += len(batch)
+                batch = []
+        if batch:
+            model._base_manager.bulk_create(batch)
+            copied += len(batch)
+        return copied
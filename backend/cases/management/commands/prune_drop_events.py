@@ -0,0 +1,19 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from cases.history import prune_drop_events
+
+
+class Command(BaseCommand):
+    help = "Удаляет историю выпадений старше DROP_EVENT_RETENTION_DAYS дней"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.DROP_EVENT_RETENTION_DAYS)
+        parser.add_argument('--batch-size', type=int, default=10_000)
+
+    def handle(self, *args, days, batch_size, **options):
+        removed = prune_drop_events(timezone.now() - timedelta(days=days), batch_size)
+        self.stdout.write(self.style.SUCCESS(f"Удалено выпадений: {removed}"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from cases.idempotency import purge_expired
+
+
+class Command(BaseCommand):
+    help = "Удаляет сохранённые ответы Idempotency-Key старше IDEMPOTENCY_KEY_TTL"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, batch_size, **options):
+        removed = purge_expired(batch_size)
+        self.stdout.write(self.style.SUCCESS(f"Удалено записей: {removed}"))
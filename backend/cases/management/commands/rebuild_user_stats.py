@@ -0,0 +1,37 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from cases.stats import rebuild_user_stats, stale_user_stats
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает UserStats по инвентарю и журналу операций (кроме числа открытых кейсов)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help="Только сверить и сообщить о расхождениях, ничего не меняя",
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, check=False, batch_size=1000, **options):
+        user_ids = list(User.objects.order_by('pk').values_list('pk', flat=True))
+        total = 0
+
+        for start in range(0, len(user_ids), batch_size):
+            batch = user_ids[start:start + batch_size]
+            if check:
+                with transaction.atomic():
+                    missing, changed = stale_user_stats(batch)
+                for stats in missing + changed:
+                    self.stdout.write(f"user {stats.user_id}: статистика устарела")
+                total += len(missing) + len(changed)
+            else:
+                total += rebuild_user_stats(batch)
+
+        if check and total:
+            raise CommandError(f"Найдено расхождений: {total}")
+
+        self.stdout.write(self.style.SUCCESS(f"Пользователей: {len(user_ids)}, обновлено записей: {total}"))
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F, Sum
+from django.db.models.functions import Coalesce
+
+from cases.models import LedgerEntry, Profile
+
+
+class Command(BaseCommand):
+    help = "Сверяет кешированный Profile.balance с суммой записей LedgerEntry"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix',
+            action='store_true',
+            help="Добавить корректирующие записи в журнал для найденных расхождений",
+        )
+
+    def handle(self, *args, fix=False, **options):
+        mismatches = list(
+            Profile.objects
+            .annotate(ledger_total=Coalesce(Sum('user__ledger__amount'), 0))
+            .exclude(balance=F('ledger_total'))
+            .values_list('user_id', 'user__username', 'balance', 'ledger_total')
+        )
+
+        for user_id, username, balance, ledger_total in mismatches:
+            self.stdout.write(f"{username}: баланс {balance}, по журналу {ledger_total} ({balance - ledger_total:+d})")
+
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS("Расхождений нет"))
+            return
+
+        if not fix:
+            raise CommandError(f"Найдено расхождений: {len(mismatches)}")
+
+        with transaction.atomic():
+            LedgerEntry.objects.bulk_create([
+                LedgerEntry(user_id=user_id, kind='adjustment', amount=balance - ledger_total, balance_after=balance)
+                for user_id, username, balance, ledger_total in mismatches
+            ])
+
+        self.stdout.write(self.style.SUCCESS(f"Исправлено расхождений: {len(mismatches)}"))
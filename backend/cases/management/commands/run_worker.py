@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from cases.jobs import run_jobs
+
+
+class Command(BaseCommand):
+    help = "Обрабатывает отложенные задачи (JOBS_BACKEND = cases.jobs.DatabaseQueue) пачками"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--interval', type=float, default=1.0, help="Пауза в секундах, когда очередь пуста")
+        parser.add_argument('--once', action='store_true', help="Обработать накопившиеся задачи и выйти")
+
+    def handle(self, *args, batch_size, interval, once, **options):
+        total = 0
+        try:
+            while True:
+                claimed = run_jobs(batch_size)
+                total += claimed
+                if claimed < batch_size:
+                    if once:
+                        break
+                    time.sleep(interval)
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f"Обработано задач: {total}"))
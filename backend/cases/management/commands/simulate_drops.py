@@ -0,0 +1,95 @@
+import math
+import random
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cases.droptables import build_drop_table
+from cases.models import Case, Vegetable
+from cases.rng import derive_uniforms
+
+CHUNK = 100_000
+
+
+class Command(BaseCommand):
+    help = "Симулирует открытия кейсов и сравнивает выпадения по редкости и EV с ожидаемыми"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--openings', type=int, default=1_000_000, help="Открытий на каждый кейс")
+        parser.add_argument('--case', type=int, action='append', dest='cases', help="id кейса (можно несколько)")
+        parser.add_argument('--seed', type=int, help="Сид для воспроизводимого прогона")
+        parser.add_argument(
+            '--hmac',
+            action='store_true',
+            help="Выводить числа через HMAC-деривацию, как при реальных открытиях",
+        )
+        parser.add_argument('--max-z', type=float, help="Завершиться с ошибкой, если |z| по какой-то редкости больше")
+
+    def handle(self, *args, openings, cases, seed, hmac, max_z, **options):
+        queryset = Case.objects.filter(pk__in=cases) if cases else Case.objects.filter(is_active=True)
+        rng = random.Random(seed)
+        failures = []
+
+        for case in queryset.order_by('pk'):
+            table = build_drop_table(case)
+            if not table:
+                self.stdout.write(f"{case.name}: в кейсе нет овощей")
+                continue
+
+            started = time.perf_counter()
+            hits = self.simulate(table, openings, rng, hmac)
+            elapsed = time.perf_counter() - started
+            failures += self.report(case, table, hits, openings, elapsed, max_z)
+
+        if failures:
+            raise CommandError(f"Отклонение больше {max_z} сигм: {', '.join(failures)}")
+
+    def simulate(self, table, openings, rng, hmac):
+        hits = Counter()
+        server_seed = '%064x' % rng.getrandbits(256)
+        client_seed = '%016x' % rng.getrandbits(64)
+
+        for start in range(0, openings, CHUNK):
+            size = min(CHUNK, openings - start)
+            if hmac:
+                index = table.alias.index
+                hits.update(index(u) for u in derive_uniforms(server_seed, client_seed, start, size))
+            else:
+                hits.update(table.alias.draw_many(size, rng))
+        return hits
+
+    def report(self, case, table, hits, openings, elapsed, max_z):
+        weights = table.weights
+        total_weight = sum(weights)
+
+        expected = Counter()
+        observed = Counter()
+        expected_value = 0.0
+        observed_value = 0
+        for i, veg in enumerate(table.vegetables):
+            expected[veg.rarity] += weights[i] / total_weight
+            observed[veg.rarity] += hits[i]
+            expected_value += weights[i] / total_weight * veg.price
+            observed_value += hits[i] * veg.price
+
+        self.stdout.write(f"{case.name} (id {case.pk}, цена {case.price}): {openings} открытий за {elapsed:.2f} с")
+        self.stdout.write(f"  {'редкость':<10} {'ожидается':>10} {'выпало':>10} {'z':>7}")
+
+        failures = []
+        for rarity in Vegetable.RARITY_WEIGHTS:
+            p = expected[rarity]
+            if not p:
+                continue
+            share = observed[rarity] / openings
+            sigma = math.sqrt(openings * p * (1 - p))
+            z = (observed[rarity] - openings * p) / sigma if sigma else 0.0
+            self.stdout.write(f"  {rarity:<10} {p:>10.4%} {share:>10.4%} {z:>+7.2f}")
+            if max_z is not None and abs(z) > max_z:
+                failures.append(f"{case.name}/{rarity}")
+
+        line = f"  EV: ожидается {expected_value:.2f}, получено {observed_value / openings:.2f}, цена {case.price}"
+        if case.price:
+            line += f", возврат {expected_value / case.price:.1%}"
+        self.stdout.write(line)
+        return failures
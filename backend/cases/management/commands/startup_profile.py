@@ -0,0 +1,105 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter: the phases a gunicorn worker goes through before its first request.
+BOOT_SCRIPT = '''
+import json, os, time
+started = time.perf_counter()
+import django
+django.setup()
+ready = time.perf_counter()
+from django.core.asgi import get_asgi_application
+get_asgi_application()
+application = time.perf_counter()
+from django.urls import get_resolver
+get_resolver().url_patterns
+urls = time.perf_counter()
+if os.environ.get("STARTUP_PROFILE_WARMUP") == "1":
+    from kabachok_backend.warmup import warm_up
+    warm_up()
+warmed = time.perf_counter()
+rss = 0
+with open("/proc/self/status") as f:
+    for line in f:
+        if line.startswith("VmRSS:"):
+            rss = int(line.split()[1]) * 1024
+print(json.dumps({
+    "setup": ready - started,
+    "application": application - ready,
+    "urlconf": urls - application,
+    "warmup": warmed - urls,
+    "rss": rss,
+}))
+'''
+
+PHASES = (
+    ('setup', "django.setup(): настройки и ready() приложений"),
+    ('application', "ASGI-приложение: middleware, скан STATIC_ROOT WhiteNoise"),
+    ('urlconf', "URLconf и модули представлений"),
+    ('warmup', "Прогрев (таблицы выпадений, каталог)"),
+)
+
+
+class Command(BaseCommand):
+    help = "Профиль холодного старта воркера: время импорта по модулям, фазы загрузки Django и RSS"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=3, help="Запусков; фазы усредняются по медиане")
+        parser.add_argument('--top', type=int, default=15, help="Сколько самых дорогих пакетов показать")
+        parser.add_argument('--api-only', action='store_true', help="Запустить с DJANGO_API_ONLY=1")
+        parser.add_argument('--warmup', action='store_true', help="Выполнить прогрев, как gunicorn с preload_app")
+
+    def handle(self, *args, runs, top, api_only, warmup, **options):
+        if not os.path.exists('/proc/self/status'):
+            raise CommandError("Нужен Linux: RSS читается из /proc")
+
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': settings.SETTINGS_MODULE}
+        if api_only:
+            env['DJANGO_API_ONLY'] = '1'
+        if warmup:
+            env['STARTUP_PROFILE_WARMUP'] = '1'
+
+        results = [self.boot(env) for _ in range(runs)]
+        median = lambda key: statistics.median(result[key] for result in results)
+
+        self.stdout.write(f"Запусков: {runs}, API_ONLY: {api_only}, прогрев: {warmup}")
+        self.stdout.write(f"  {'Процесс целиком':<60} {median('total') * 1000:8.1f} мс")
+        self.stdout.write(f"  {'Импорты (по -X importtime)':<60} {median('imports') * 1000:8.1f} мс")
+        for key, label in PHASES:
+            if key != 'warmup' or warmup:
+                self.stdout.write(f"  {label:<60} {median(key) * 1000:8.1f} мс")
+        self.stdout.write(f"  {'RSS после загрузки':<60} {median('rss') / 2 ** 20:8.1f} МиБ")
+
+        self.stdout.write("Самые дорогие пакеты (собственное время импорта, последний запуск):")
+        for package, seconds in results[-1]['packages'].most_common(top):
+            self.stdout.write(f"  {package:<60} {seconds * 1000:8.1f} мс")
+
+    def boot(self, env):
+        started = time.perf_counter()
+        process = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', BOOT_SCRIPT],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        total = time.perf_counter() - started
+        if process.returncode:
+            raise CommandError(process.stderr[-2000:])
+
+        # "import time: self [us] | cumulative | imported package", nested modules are indented.
+        packages = Counter()
+        imports = 0
+        for line in process.stderr.splitlines():
+            if not line.startswith('import time:') or 'imported package' in line:
+                continue
+            own, cumulative, module = line[len('import time:'):].split('|')
+            packages[module.strip().split('.')[0]] += int(own) / 1e6
+            imports += int(own) / 1e6
+
+        return {**json.loads(process.stdout.strip().splitlines()[-1]), 'total': total, 'imports': imports, 'packages': packages}
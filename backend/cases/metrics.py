@@ -0,0 +1,210 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import connection
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+METRICS = {
+    'kabachok_request_duration_seconds': ('Wall time per request', DURATION_BUCKETS),
+    'kabachok_request_db_queries': ('Database queries per request', QUERY_BUCKETS),
+    'kabachok_request_db_duration_seconds': ('Time spent in the database per request', DURATION_BUCKETS),
+    'kabachok_request_render_duration_seconds': ('Time spent rendering the response body', DURATION_BUCKETS),
+}
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """In-process histograms keyed by metric and view; one registry per worker."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.over_budget = {}
+
+    def observe(self, view, **values):
+        with self.lock:
+            for metric, value in values.items():
+                histogram = self.histograms.get((metric, view))
+                if histogram is None:
+                    histogram = self.histograms[(metric, view)] = Histogram(METRICS[metric][1])
+                histogram.observe(value)
+
+    def count_over_budget(self, view):
+        with self.lock:
+            self.over_budget[view] = self.over_budget.get(view, 0) + 1
+
+    def render(self):
+        lines = []
+        with self.lock:
+            for metric, (help_text, buckets) in METRICS.items():
+                lines.append(f'# HELP {metric} {help_text}')
+                lines.append(f'# TYPE {metric} histogram')
+                for (name, view), histogram in sorted(self.histograms.items()):
+                    if name != metric:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(buckets + ('+Inf',), histogram.counts):
+                        cumulative += count
+                        lines.append(f'{metric}_bucket{{view="{view}",le="{bound}"}} {cumulative}')
+                    lines.append(f'{metric}_sum{{view="{view}"}} {histogram.sum}')
+                    lines.append(f'{metric}_count{{view="{view}"}} {histogram.count}')
+
+            metric = 'kabachok_request_query_budget_exceeded_total'
+            lines.append(f'# HELP {metric} Requests that ran more queries than METRICS_QUERY_BUDGET')
+            lines.append(f'# TYPE {metric} counter')
+            for view, count in sorted(self.over_budget.items()):
+                lines.append(f'{metric}{{view="{view}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+# The metrics of the request being handled; sync_to_async copies it into the thread running the ORM calls.
+current_metrics = ContextVar('current_metrics', default=None)
+
+
+def view_name(request, view_func):
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return f'{view_func.__module__}.{view_func.__name__}'
+
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(request.method.lower(), request.method.lower())
+    return f'{cls.__name__}.{action}'
+
+
+def record_query(execute, sql, params, many, context):
+    metrics = current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics['queries'] += 1
+        metrics['db_time'] += time.perf_counter() - started
+
+
+def install_query_recorder(**kwargs):
+    # request_started reaches sync receivers in the thread that runs the request's
+    # queries, also under ASGI, where that is not the thread of the middleware.
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class QueryMetricsMiddleware:
+    """
+    Records wall time, DB query count, DB time and render time per resolved
+    view, and warns when a request goes over ``METRICS_QUERY_BUDGET`` queries.
+    Runs natively in both modes, so it does not put a thread hop in front of
+    async views.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        request_started.connect(install_query_recorder)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+            # Django adapts hooks to the handler's mode; a sync one would go through a thread.
+            self.process_template_response = self.aprocess_template_response
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+
+        token = self.start(request)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        self.record(request, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        token = self.start(request)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        self.record(request, time.perf_counter() - started)
+        return response
+
+    def start(self, request):
+        request._metrics = {'queries': 0, 'db_time': 0.0, 'render_time': 0.0}
+        return current_metrics.set(request._metrics)
+
+    def record(self, request, elapsed):
+        if request.resolver_match is None:
+            return
+
+        view = view_name(request, request.resolver_match.func)
+        metrics = request._metrics
+        registry.observe(
+            view,
+            kabachok_request_duration_seconds=elapsed,
+            kabachok_request_db_queries=metrics['queries'],
+            kabachok_request_db_duration_seconds=metrics['db_time'],
+            kabachok_request_render_duration_seconds=metrics['render_time'],
+        )
+        if metrics['queries'] > settings.METRICS_QUERY_BUDGET:
+            registry.count_over_budget(view)
+            logger.warning(
+                "%s %s (%s) ran %d queries, budget is %d",
+                request.method, request.path, view, metrics['queries'], settings.METRICS_QUERY_BUDGET,
+            )
+
+    def process_template_response(self, request, response):
+        return self.time_render(request, response)
+
+    async def aprocess_template_response(self, request, response):
+        return self.time_render(request, response)
+
+    def time_render(self, request, response):
+        started = time.perf_counter()
+
+        def record_render(response):
+            request._metrics['render_time'] += time.perf_counter() - started
+
+        response.add_post_render_callback(record_render)
+        return response
+
+
+def metrics_view(request):
+    if not settings.METRICS_ENABLED:
+        raise Http404
+
+    # Without a token nobody may read them: the labels name every view and its query counts.
+    if not settings.METRICS_TOKEN or request.headers.get('Authorization') != f'Bearer {settings.METRICS_TOKEN}':
+        return HttpResponseForbidden()
+
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
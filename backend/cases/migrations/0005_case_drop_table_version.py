@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cases', '0004_inventory'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='case',
+            name='drop_table_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
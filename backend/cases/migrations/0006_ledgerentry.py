@@ -0,0 +1,43 @@
+# Generated by Django 5.1.6 on 2026-10-18 12:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def open_ledger(apps, schema_editor):
+    Profile = apps.get_model('cases', 'Profile')
+    LedgerEntry = apps.get_model('cases', 'LedgerEntry')
+    db = schema_editor.connection.alias
+    LedgerEntry.objects.using(db).bulk_create([
+        LedgerEntry(user_id=user_id, kind='adjustment', amount=balance, balance_after=balance)
+        for user_id, balance in Profile.objects.using(db).exclude(balance=0).values_list('user_id', 'balance')
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cases', '0005_case_drop_table_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('deposit', 'Пополнение'), ('open', 'Открытие кейса'), ('sell', 'Продажа'), ('adjustment', 'Корректировка')], max_length=20, verbose_name='Операция')),
+                ('amount', models.IntegerField(verbose_name='Сумма')),
+                ('balance_after', models.IntegerField(verbose_name='Баланс после операции')),
+                ('idempotency_key', models.CharField(blank=True, max_length=100, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'created_at'], name='cases_ledge_user_id_8d4d19_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'idempotency_key'), name='ledger_user_idempotency_key')],
+            },
+        ),
+        migrations.RunPython(open_ledger, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.db import migrations
+
+
+def create_missing_profiles(apps, schema_editor):
+    # Profiles used to be (re)created on every User save; stateless auth no
+    # longer does that, so make sure every existing user has one.
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Profile = apps.get_model('cases', 'Profile')
+    db = schema_editor.connection.alias
+    Profile.objects.using(db).bulk_create([
+        Profile(user_id=user_id)
+        for user_id in User.objects.using(db).filter(profile__isnull=True).values_list('pk', flat=True)
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cases', '0007_inventory_user_acquired_at_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(create_missing_profiles, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.1.6 on 2026-10-18 12:15
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Coalesce
+
+
+def fill_user_stats(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Inventory = apps.get_model('cases', 'Inventory')
+    LedgerEntry = apps.get_model('cases', 'LedgerEntry')
+    UserStats = apps.get_model('cases', 'UserStats')
+    db = schema_editor.connection.alias
+
+    stats = {user_id: UserStats(user_id=user_id) for user_id in User.objects.using(db).values_list('pk', flat=True)}
+
+    holdings = (
+        Inventory.objects.using(db).filter(quantity__gt=0)
+        .values('user_id', 'vegetable__rarity')
+        .annotate(items=Sum('quantity'), value=Sum(F('quantity') * F('vegetable__price')))
+    )
+    for row in holdings:
+        row_stats = stats[row['user_id']]
+        row_stats.inventory_value += row['value']
+        row_stats.inventory_items += row['items']
+        field = f"{row['vegetable__rarity']}_count"
+        setattr(row_stats, field, getattr(row_stats, field) + row['items'])
+
+    # Batch opens write one ledger entry, so cases_opened starts as a lower bound.
+    ledger = LedgerEntry.objects.using(db).values('user_id').annotate(
+        net_profit=Coalesce(Sum('amount', filter=Q(kind__in=['open', 'sell'])), 0),
+        total_deposited=Coalesce(Sum('amount', filter=Q(kind='deposit')), 0),
+        opens=Count('id', filter=Q(kind='open')),
+    )
+    for row in ledger:
+        row_stats = stats[row['user_id']]
+        row_stats.net_profit = row['net_profit']
+        row_stats.total_deposited = row['total_deposited']
+        row_stats.cases_opened = row['opens']
+
+    UserStats.objects.using(db).bulk_create(stats.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('cases', '0008_create_missing_profiles'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('inventory_value', models.IntegerField(default=0, verbose_name='Стоимость инвентаря')),
+                ('inventory_items', models.IntegerField(default=0, verbose_name='Овощей в инвентаре')),
+                ('common_count', models.IntegerField(default=0, verbose_name='Обычных')),
+                ('uncommon_count', models.IntegerField(default=0, verbose_name='Необычных')),
+                ('rare_count', models.IntegerField(default=0, verbose_name='Редких')),
+                ('epic_count', models.IntegerField(default=0, verbose_name='Эпических')),
+                ('legendary_count', models.IntegerField(default=0, verbose_name='Легендарных')),
+                ('cases_opened', models.IntegerField(default=0, verbose_name='Открыто кейсов')),
+                ('net_profit', models.IntegerField(default=0, verbose_name='Прибыль (продажи минус открытия)')),
+                ('total_deposited', models.IntegerField(default=0, verbose_name='Всего пополнено')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-inventory_value', 'user'], name='userstats_value_rank'), models.Index(fields=['-net_profit', 'user'], name='userstats_profit_rank'), models.Index(fields=['-cases_opened', 'user'], name='userstats_opened_rank')],
+            },
+        ),
+        migrations.RunPython(fill_user_stats, migrations.RunPython.noop),
+    ]
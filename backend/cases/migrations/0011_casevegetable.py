@@ -0,0 +1,61 @@
+# Generated by Django 5.1.6 on 2026-10-18 12:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+RARITY_WEIGHTS = {'common': 10, 'uncommon': 5, 'rare': 3, 'epic': 2, 'legendary': 1}
+
+
+def fill_probabilities(apps, schema_editor):
+    CaseVegetable = apps.get_model('cases', 'CaseVegetable')
+    db = schema_editor.connection.alias
+    entries = list(CaseVegetable.objects.using(db).select_related('vegetable'))
+    totals = {}
+    for entry in entries:
+        totals[entry.case_id] = totals.get(entry.case_id, 0) + RARITY_WEIGHTS[entry.vegetable.rarity]
+    for entry in entries:
+        entry.probability = RARITY_WEIGHTS[entry.vegetable.rarity] / totals[entry.case_id]
+    CaseVegetable.objects.using(db).bulk_update(entries, ['probability'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cases', '0010_seedpair'),
+    ]
+
+    operations = [
+        # Adopt the existing auto-created m2m table as an explicit through model.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='CaseVegetable',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('case', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entries', to='cases.case')),
+                        ('vegetable', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='cases.vegetable')),
+                    ],
+                    options={
+                        'db_table': 'cases_case_vegetables',
+                        'unique_together': {('case', 'vegetable')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='case',
+                    name='vegetables',
+                    field=models.ManyToManyField(through='cases.CaseVegetable', to='cases.vegetable', verbose_name='Овощи в кейсе'),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='casevegetable',
+            name='weight',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Вес (пусто — по редкости)'),
+        ),
+        migrations.AddField(
+            model_name='casevegetable',
+            name='probability',
+            field=models.FloatField(default=0, editable=False, verbose_name='Шанс выпадения'),
+        ),
+        migrations.RunPython(fill_probabilities, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 12:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cases', '0013_dropevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vegetable',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.6 on 2026-10-18 12:52
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cases', '0016_profile_version'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='ledgerentry',
+            name='ledger_user_idempotency_key',
+        ),
+        migrations.RemoveField(
+            model_name='ledgerentry',
+            name='idempotency_key',
+        ),
+    ]
@@ -2,6 +2,7 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+from django.utils import timezone
 
 class Vegetable(models.Model):
     RARITY_CHOICES = [
@@ -11,12 +12,22 @@ class Vegetable(models.Model):
         ('epic', '🍆 Эпический'),
         ('legendary', '🎃 Легендарный'),
     ]
+
+    RARITY_WEIGHTS = {
+        'common': 10,
+        'uncommon': 5,
+        'rare': 3,
+        'epic': 2,
+        'legendary': 1,
+    }
     
     name = models.CharField(max_length=100, verbose_name="Название")
     emoji = models.CharField(max_length=10, default='🥦', verbose_name="Эмодзи")
     rarity = models.CharField(max_length=20, choices=RARITY_CHOICES, default='common', verbose_name="Редкость")
     description = models.TextField(blank=True, verbose_name="Описание")
     price = models.IntegerField(default=10, verbose_name="Цена в монетах")
+    # Bumped on every save; cases.rendering memoizes serialized vegetables by (id, version).
+    version = models.PositiveIntegerField(default=1, editable=False)
     
     def __str__(self):
         return f"{self.emoji} {self.name}"
@@ -26,16 +37,42 @@ class Case(models.Model):
     description = models.TextField(blank=True, verbose_name="Описание кейса")
     price = models.IntegerField(default=100, verbose_name="Цена открытия")
     image_url = models.URLField(blank=True, verbose_name="Картинка кейса")
-    vegetables = models.ManyToManyField(Vegetable, verbose_name="Овощи в кейсе")
+    vegetables = models.ManyToManyField(Vegetable, through='CaseVegetable', verbose_name="Овощи в кейсе")
     is_active = models.BooleanField(default=True, verbose_name="Активен")
+    drop_table_version = models.PositiveIntegerField(default=0, editable=False)
     
     def __str__(self):
         return self.name
 
+class CaseVegetable(models.Model):
+    """
+    A vegetable in a case. ``weight`` overrides ``Vegetable.RARITY_WEIGHTS``
+    for this case; ``probability`` is the normalized chance, recomputed by
+    ``cases.droptables.update_drop_chances`` whenever the case's contents change.
+    """
+
+    case = models.ForeignKey(Case, on_delete=models.CASCADE, related_name='entries')
+    vegetable = models.ForeignKey(Vegetable, on_delete=models.CASCADE)
+    weight = models.PositiveIntegerField(null=True, blank=True, verbose_name="Вес (пусто — по редкости)")
+    probability = models.FloatField(default=0, editable=False, verbose_name="Шанс выпадения")
+
+    class Meta:
+        db_table = 'cases_case_vegetables'
+        unique_together = ['case', 'vegetable']
+
+    @property
+    def effective_weight(self):
+        return Vegetable.RARITY_WEIGHTS[self.vegetable.rarity] if self.weight is None else self.weight
+
+    def __str__(self):
+        return f"{self.case.name}: {self.vegetable.name} ({self.probability:.2%})"
+
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     balance = models.IntegerField(default=0, verbose_name="Баланс")
     created_at = models.DateTimeField(auto_now_add=True)
+    # Bumped with every balance change; cases.hotstate keeps the cached state of the newest version.
+    version = models.PositiveIntegerField(default=1, editable=False)
 
     def __str__(self):
         return f"{self.user.username} - {self.balance} монет"
@@ -48,18 +85,161 @@ class Inventory(models.Model):
 
     class Meta:
         unique_together = ['user', 'vegetable']  
+        indexes = [
+            models.Index(fields=['user', 'acquired_at']),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.vegetable.name} x{self.quantity}"
 
+class LedgerEntry(models.Model):
+    KIND_CHOICES = [
+        ('deposit', 'Пополнение'),
+        ('open', 'Открытие кейса'),
+        ('sell', 'Продажа'),
+        ('adjustment', 'Корректировка'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='ledger')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, verbose_name="Операция")
+    amount = models.IntegerField(verbose_name="Сумма")
+    balance_after = models.IntegerField(verbose_name="Баланс после операции")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} {self.kind} {self.amount:+d}"
+
+class UserStats(models.Model):
+    """
+    Denormalized per-user totals, updated in the same transaction as the
+    open/sell/deposit that changes them (see ``cases.stats``).
+    """
+
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    inventory_value = models.IntegerField(default=0, verbose_name="Стоимость инвентаря")
+    inventory_items = models.IntegerField(default=0, verbose_name="Овощей в инвентаре")
+    common_count = models.IntegerField(default=0, verbose_name="Обычных")
+    uncommon_count = models.IntegerField(default=0, verbose_name="Необычных")
+    rare_count = models.IntegerField(default=0, verbose_name="Редких")
+    epic_count = models.IntegerField(default=0, verbose_name="Эпических")
+    legendary_count = models.IntegerField(default=0, verbose_name="Легендарных")
+    cases_opened = models.IntegerField(default=0, verbose_name="Открыто кейсов")
+    net_profit = models.IntegerField(default=0, verbose_name="Прибыль (продажи минус открытия)")
+    total_deposited = models.IntegerField(default=0, verbose_name="Всего пополнено")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-inventory_value', 'user'], name='userstats_value_rank'),
+            models.Index(fields=['-net_profit', 'user'], name='userstats_profit_rank'),
+            models.Index(fields=['-cases_opened', 'user'], name='userstats_opened_rank'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.inventory_value} монет в инвентаре"
+
+class SeedPair(models.Model):
+    """
+    Commit-reveal seeds for provably fair drops. ``server_seed_hash`` is shown
+    while the pair is in use; ``server_seed`` is revealed on rotation so
+    every opening under it can be re-derived (see ``cases.rng``).
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='seed_pairs')
+    server_seed = models.CharField(max_length=64)
+    server_seed_hash = models.CharField(max_length=64)
+    client_seed = models.CharField(max_length=64, verbose_name="Клиентский сид")
+    nonce = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    revealed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user'], condition=models.Q(revealed_at__isnull=True), name='seedpair_one_active_per_user',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} {self.server_seed_hash[:12]} #{self.nonce}"
+
+class DropEvent(models.Model):
+    """
+    Append-only log of what every opening produced; ``price`` is the
+    vegetable's price at drop time. Written in batches by the ``drops.record`` job.
+    """
+
+    # user and case are covered by the composite indexes below.
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False, related_name='+')
+    case = models.ForeignKey(Case, on_delete=models.SET_NULL, null=True, db_index=False, related_name='+')
+    vegetable = models.ForeignKey(Vegetable, on_delete=models.SET_NULL, null=True, related_name='+')
+    price = models.IntegerField()
+    nonce = models.PositiveIntegerField(null=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_at']),
+            models.Index(fields=['case', 'created_at']),
+            models.Index(fields=['created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.vegetable_id} {self.created_at:%Y-%m-%d %H:%M}"
+
+class IdempotencyRecord(models.Model):
+    """
+    The stored response to a money-moving request sent with an
+    ``Idempotency-Key`` header (see ``cases.idempotency``).
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    key = models.CharField(max_length=100)
+    request_hash = models.CharField(max_length=64)
+    # Empty until the request finishes; the row is never visible to others in that state.
+    status_code = models.PositiveSmallIntegerField(null=True)
+    response_body = models.JSONField(null=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='idempotency_user_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.key} -> {self.status_code}"
+
+class Job(models.Model):
+    """
+    Deferred work for ``manage.py run_worker`` (see ``cases.jobs``). Done jobs
+    are deleted; a job that keeps failing is kept with ``failed_at`` set.
+    """
+
+    kind = models.CharField(max_length=50)
+    payload = models.JSONField()
+    run_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    failed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['run_at', 'id'], condition=models.Q(failed_at__isnull=True), name='job_due'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk}"
+
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
     if created:
         Profile.objects.create(user=instance)
 
 @receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    try:
-        instance.profile.save()
-    except Profile.DoesNotExist:
-        Profile.objects.create(user=instance)
\ No newline at end of file
+def create_user_stats(sender, instance, created, **kwargs):
+    if created:
+        UserStats.objects.create(user=instance)
\ No newline at end of file
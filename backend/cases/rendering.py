@@ -0,0 +1,112 @@
+from rest_framework import serializers
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import CaseVegetable, Vegetable
+
+VEGETABLE_FIELDS = ('id', 'name', 'emoji', 'rarity', 'description', 'price')
+INVENTORY_VALUES = ('id', 'quantity', 'acquired_at', 'vegetable_id', 'vegetable__version')
+CASE_VALUES = ('id', 'name', 'description', 'price', 'image_url', 'is_active')
+MEMO_MAX_SIZE = 10_000
+
+RARITY_DISPLAY = dict(Vegetable.RARITY_CHOICES)
+
+# Same options as DRF's JSONRenderer with the default settings (UNICODE_JSON, COMPACT_JSON, STRICT_JSON).
+encoder = JSONEncoder(ensure_ascii=False, separators=(',', ':'), allow_nan=False)
+datetime_field = serializers.DateTimeField()
+
+# vegetable id -> (version, serialized dict); the dicts are shared, treat them as read-only.
+_vegetables = {}
+
+
+def render_json(data):
+    """The bytes ``JSONRenderer().render(data)`` would produce, without the per-call renderer setup."""
+    return encoder.encode(data).replace('\u2028', '\\u2028').replace('\u2029', '\\u2029').encode()
+
+
+def vegetable_dict(values):
+    """What ``VegetableSerializer`` returns for a vegetable with these column ``values``."""
+    return {
+        'id': values['id'],
+        'name': values['name'],
+        'emoji': values['emoji'],
+        'rarity': values['rarity'],
+        'rarity_display': str(RARITY_DISPLAY.get(values['rarity'], values['rarity'])),
+        'description': values['description'],
+        'price': values['price'],
+    }
+
+
+def vegetable_dicts(versions):
+    """
+    Serialized vegetables for ``{id: version}``. Only vegetables missing from
+    the memo, or memoized at an older version, are read from the database.
+    """
+    result = {}
+    missing = []
+    for pk, version in versions.items():
+        memoized = _vegetables.get(pk)
+        if memoized is not None and memoized[0] == version:
+            result[pk] = memoized[1]
+        else:
+            missing.append(pk)
+
+    if missing:
+        # The result is collected apart from the memo, so clearing it cannot lose what this call needs.
+        if len(_vegetables) + len(missing) > MEMO_MAX_SIZE:
+            _vegetables.clear()
+        for values in Vegetable.objects.filter(pk__in=missing).values('version', *VEGETABLE_FIELDS):
+            result[values['id']] = vegetable_dict(values)
+            _vegetables[values['id']] = (values['version'], result[values['id']])
+
+    return result
+
+
+def inventory_values(queryset):
+    """Turn an inventory queryset into the dict rows ``inventory_rows`` expects; they still paginate."""
+    return queryset.values(*INVENTORY_VALUES)
+
+
+def inventory_rows(rows):
+    """``InventorySerializer(..., many=True).data`` for rows from ``inventory_values``."""
+    vegetables = vegetable_dicts({row['vegetable_id']: row['vegetable__version'] for row in rows})
+    return [
+        {
+            'id': row['id'],
+            'vegetable': vegetables[row['vegetable_id']],
+            'quantity': row['quantity'],
+            'acquired_at': datetime_field.to_representation(row['acquired_at']),
+        }
+        for row in rows
+    ]
+
+
+def case_rows(queryset):
+    """``CaseSerializer(..., many=True).data`` for ``queryset``, in two queries and without model instances."""
+    cases = list(queryset.values(*CASE_VALUES))
+    entries = list(
+        CaseVegetable.objects.filter(case_id__in=[case['id'] for case in cases])
+        .order_by('pk')
+        .values_list('case_id', 'vegetable_id', 'vegetable__version', 'probability')
+    )
+    vegetables = vegetable_dicts({vegetable_id: version for case_id, vegetable_id, version, probability in entries})
+
+    contents = {case['id']: ([], {}) for case in cases}
+    for case_id, vegetable_id, version, probability in entries:
+        case_vegetables, drop_chances = contents[case_id]
+        case_vegetables.append(vegetables[vegetable_id])
+        drop_chances[vegetable_id] = round(probability, 6)
+
+    return [
+        {
+            'id': case['id'],
+            'name': case['name'],
+            'description': case['description'],
+            'price': case['price'],
+            'image_url': case['image_url'],
+            # As the prefetch returns them: vegetables by id, chances in entry order.
+            'vegetables': sorted(contents[case['id']][0], key=lambda vegetable: vegetable['id']),
+            'drop_chances': contents[case['id']][1],
+            'is_active': case['is_active'],
+        }
+        for case in cases
+    ]
@@ -0,0 +1,107 @@
+import hashlib
+import hmac
+import secrets
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import SeedPair
+
+# 53 random bits per draw, the full precision of a float in [0, 1).
+UNIT = 2 ** -53
+
+
+def hash_server_seed(server_seed):
+    return hashlib.sha256(server_seed.encode()).hexdigest()
+
+
+def derive_uniforms(server_seed, client_seed, nonce, count=1):
+    """
+    Floats in [0, 1) for nonces ``nonce`` .. ``nonce + count - 1``: the top
+    53 bits of HMAC-SHA256(server_seed, "client_seed:nonce"), one per opening.
+    """
+    key = server_seed.encode()
+    prefix = f'{client_seed}:'.encode()
+    sha256 = hashlib.sha256
+    return [
+        (int.from_bytes(hmac.new(key, prefix + str(n).encode(), sha256).digest()[:8], 'big') >> 11) * UNIT
+        for n in range(nonce, nonce + count)
+    ]
+
+
+def new_seed_pair(user, client_seed=None):
+    server_seed = secrets.token_hex(32)
+    return SeedPair.objects.create(
+        user_id=user.pk,
+        server_seed=server_seed,
+        server_seed_hash=hash_server_seed(server_seed),
+        client_seed=client_seed or secrets.token_hex(8),
+    )
+
+
+def active_seed_pair(user, lock=False):
+    """The user's unrevealed seed pair, created on first use."""
+    queryset = SeedPair.objects.filter(user_id=user.pk, revealed_at__isnull=True)
+    if lock:
+        queryset = queryset.select_for_update()
+
+    pair = queryset.first()
+    if pair is None:
+        try:
+            with transaction.atomic():
+                pair = new_seed_pair(user)
+        except IntegrityError:
+            # A concurrent request created it first.
+            pair = queryset.get()
+    return pair
+
+
+def rotate_seed_pair(user, client_seed=None):
+    """Reveal the active pair and start a new one; returns ``(revealed, current)``."""
+    with transaction.atomic():
+        revealed = active_seed_pair(user, lock=True)
+        revealed.revealed_at = timezone.now()
+        revealed.save(update_fields=['revealed_at'])
+        current = new_seed_pair(user, client_seed)
+    return revealed, current
+
+
+class SystemRNG:
+    """Draws from the OS RNG. Not reproducible, so openings carry no proof."""
+
+    def draw(self, user, count):
+        rng = secrets.SystemRandom()
+        return [rng.random() for _ in range(count)], None
+
+
+class CommitRevealRNG:
+    """
+    Derives each opening from the user's seed pair and a nonce, so it can be
+    checked once the server seed is revealed. ``draw`` must run inside the
+    opening's transaction: the nonces it consumes roll back with a failed debit.
+    """
+
+    def draw(self, user, count):
+        pair = active_seed_pair(user, lock=True)
+        SeedPair.objects.filter(pk=pair.pk).update(nonce=F('nonce') + count)
+
+        proof = {
+            'server_seed_hash': pair.server_seed_hash,
+            'client_seed': pair.client_seed,
+            'nonce': pair.nonce,
+            'count': count,
+        }
+        return derive_uniforms(pair.server_seed, pair.client_seed, pair.nonce, count), proof
+
+
+_rng = None
+
+
+def get_rng():
+    global _rng
+    if _rng is None:
+        _rng = import_string(settings.DROP_RNG_BACKEND)()
+    return _rng
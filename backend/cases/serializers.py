@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Case, Vegetable, Profile, Inventory
+from .models import Case, Vegetable, Profile, Inventory, SeedPair, UserStats
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from django.contrib.auth.models import User
 
@@ -15,6 +15,11 @@ class ProfileSerializer(serializers.ModelSerializer):
         model = Profile
         fields = ['balance', 'created_at']
 
+class UserStatsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UserStats
+        exclude = ['user']
+
 class UserSerializer(serializers.ModelSerializer):
     profile = ProfileSerializer(read_only=True)  
 
@@ -42,18 +47,33 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
     def get_token(cls, user):
         token = super().get_token(user)
         token['username'] = user.username
+        token['tier'] = 'staff' if user.is_staff else 'user'
         return token
 
 class CaseSerializer(serializers.ModelSerializer):
     vegetables = VegetableSerializer(many=True, read_only=True)
+    drop_chances = serializers.SerializerMethodField()
     
     class Meta:
         model = Case
-        fields = ['id', 'name', 'description', 'price', 'image_url', 'vegetables', 'is_active']
+        fields = ['id', 'name', 'description', 'price', 'image_url', 'vegetables', 'drop_chances', 'is_active']
+    
+    def get_drop_chances(self, obj):
+        return {entry.vegetable_id: round(entry.probability, 6) for entry in obj.entries.all()}
 
 class InventorySerializer(serializers.ModelSerializer):
     vegetable = VegetableSerializer(read_only=True)
     
     class Meta:
         model = Inventory
-        fields = ['id', 'vegetable', 'quantity', 'acquired_at']
\ No newline at end of file
+        fields = ['id', 'vegetable', 'quantity', 'acquired_at']
+
+class SeedPairSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SeedPair
+        fields = ['server_seed_hash', 'client_seed', 'nonce', 'created_at']
+
+class RevealedSeedPairSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SeedPair
+        fields = ['server_seed', 'server_seed_hash', 'client_seed', 'nonce', 'created_at', 'revealed_at']
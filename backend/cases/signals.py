@@ -0,0 +1,121 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .db import SOURCE_ALIAS
+from .droptables import update_drop_chances
+from .hotstate import invalidate_states
+from .models import Case, CaseVegetable, Inventory, Profile, Vegetable
+from .stats import rebuild_user_stats
+
+
+def bump_drop_table_version(cases):
+    cases.update(drop_table_version=F('drop_table_version') + 1)
+
+
+def case_contents_changed(case_ids):
+    update_drop_chances(case_ids)
+    bump_drop_table_version(Case.objects.filter(pk__in=case_ids))
+
+
+def holder_ids(vegetable):
+    return list(Inventory.objects.filter(vegetable=vegetable, quantity__gt=0).values_list('user_id', flat=True))
+
+
+@receiver(pre_save, sender=Case)
+def keep_drop_table_version(sender, instance, raw=False, **kwargs):
+    # save() writes every column; a stale in-memory version would roll the
+    # counter back and let the bump below reuse a version already cached.
+    if not raw and instance.pk is not None:
+        current = Case.objects.filter(pk=instance.pk).values_list('drop_table_version', flat=True).first()
+        if current is not None:
+            instance.drop_table_version = current
+
+
+@receiver(post_save, sender=Case)
+def case_saved(sender, instance, created, **kwargs):
+    if not created:
+        bump_drop_table_version(Case.objects.filter(pk=instance.pk))
+        instance.drop_table_version += 1
+
+
+@receiver(m2m_changed, sender=Case.vegetables.through)
+def case_vegetables_added(sender, instance, action, reverse, pk_set, **kwargs):
+    # add() bulk-inserts rows without post_save; removals delete CaseVegetable
+    # rows one by one and are handled by case_vegetable_deleted.
+    if action == 'post_add':
+        case_contents_changed(list(pk_set) if reverse else [instance.pk])
+
+
+@receiver(post_save, sender=CaseVegetable)
+def case_vegetable_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        case_contents_changed([instance.case_id])
+
+
+@receiver(post_delete, sender=CaseVegetable)
+def case_vegetable_deleted(sender, instance, **kwargs):
+    case_contents_changed([instance.case_id])
+
+
+@receiver(pre_save, sender=Vegetable)
+def keep_vegetable_version(sender, instance, raw=False, **kwargs):
+    # Same as keep_drop_table_version: a stale version would be reused by the bump.
+    if not raw and instance.pk is not None:
+        current = Vegetable.objects.filter(pk=instance.pk).values_list('version', flat=True).first()
+        if current is not None:
+            instance.version = current
+
+
+@receiver(post_save, sender=Vegetable)
+def vegetable_saved(sender, instance, created, **kwargs):
+    if not created:
+        Vegetable.objects.filter(pk=instance.pk).update(version=F('version') + 1)
+        instance.version += 1
+        # A new rarity changes the drop chances of every case it is in.
+        case_contents_changed(list(Case.objects.filter(vegetables=instance).values_list('pk', flat=True)))
+        # A new price or rarity changes the value and counts of everyone holding it.
+        rebuild_user_stats(holder_ids(instance))
+
+
+@receiver(pre_delete, sender=Vegetable)
+def vegetable_deleted(sender, instance, **kwargs):
+    # Its CaseVegetable rows are deleted first and update the cases they were in.
+    instance._holder_ids = holder_ids(instance)
+
+
+@receiver(post_delete, sender=Vegetable)
+def vegetable_removed(sender, instance, **kwargs):
+    rebuild_user_stats(instance.__dict__.pop('_holder_ids', []))
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    # The hot state carries the fields UserSerializer returns.
+    if not created:
+        transaction.on_commit(lambda: invalidate_states([instance.pk]))
+
+
+@receiver(post_save, sender=Profile)
+def profile_saved(sender, instance, created, **kwargs):
+    # A balance saved outside cases.wallet (admin, shell) does not bump the version.
+    if not created:
+        transaction.on_commit(lambda: invalidate_states([instance.user_id]))
+
+
+@receiver(post_delete, sender=Profile)
+def profile_deleted(sender, instance, **kwargs):
+    transaction.on_commit(lambda: invalidate_states([instance.user_id]))
+
+
+@receiver(connection_created)
+def tune_sqlite_connection(sender, connection, **kwargs):
+    # import_sqlite's migrated copy of its source is read once and thrown away.
+    if connection.vendor == 'sqlite' and connection.alias != SOURCE_ALIAS:
+        with connection.cursor() as cursor:
+            for pragma, value in settings.SQLITE_PRAGMAS.items():
+                cursor.execute(f'PRAGMA {pragma} = {value}')
@@ -0,0 +1,146 @@
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from django.db.models.functions import Coalesce
+
+from .hotstate import invalidate_states
+from .models import Inventory, LedgerEntry, UserStats, Vegetable
+
+RARITY_FIELDS = {rarity: f'{rarity}_count' for rarity in Vegetable.RARITY_WEIGHTS}
+DERIVED_FIELDS = ['inventory_value', 'inventory_items', *RARITY_FIELDS.values(), 'net_profit', 'total_deposited']
+
+LEADERBOARD_ORDERINGS = {
+    'value': 'inventory_value',
+    'profit': 'net_profit',
+    'opened': 'cases_opened',
+}
+LEADERBOARD_FIELDS = ['inventory_value', 'inventory_items', *RARITY_FIELDS.values(), 'cases_opened', 'net_profit']
+
+
+def apply_deltas(user_id, **deltas):
+    """Add ``deltas`` to the user's stats row in one UPDATE; call inside the caller's transaction."""
+    updates = {field: F(field) + delta for field, delta in deltas.items() if delta}
+    if not updates:
+        return
+
+    if not UserStats.objects.filter(user_id=user_id).update(**updates):
+        # Rows are created with the user; this only covers users inserted around the signal.
+        UserStats.objects.get_or_create(user_id=user_id)
+        UserStats.objects.filter(user_id=user_id).update(**updates)
+
+
+def record_open(user_id, cost, cases_opened, rewards):
+    """``rewards`` are the dropped ``Vegetable`` objects, one per item."""
+    deltas = Counter()
+    for vegetable in rewards:
+        deltas['inventory_value'] += vegetable.price
+        deltas[RARITY_FIELDS[vegetable.rarity]] += 1
+
+    apply_deltas(
+        user_id,
+        cases_opened=cases_opened,
+        inventory_items=len(rewards),
+        net_profit=-cost,
+        **deltas,
+    )
+
+
+def record_sale(user_id, items):
+    """``items`` are ``(rarity, price, quantity)`` tuples for what was sold."""
+    deltas = Counter()
+    for rarity, price, quantity in items:
+        deltas['inventory_value'] -= price * quantity
+        deltas['inventory_items'] -= quantity
+        deltas[RARITY_FIELDS[rarity]] -= quantity
+        deltas['net_profit'] += price * quantity
+
+    apply_deltas(user_id, **deltas)
+
+
+def record_deposit(user_id, amount):
+    apply_deltas(user_id, total_deposited=amount)
+
+
+def compute_user_stats(user_ids):
+    """
+    Recompute the derived columns for ``user_ids`` from ``Inventory`` and the
+    ledger. ``cases_opened`` has no other source of truth and is not included.
+    """
+    stats = {user_id: dict.fromkeys(DERIVED_FIELDS, 0) for user_id in user_ids}
+
+    holdings = (
+        Inventory.objects.filter(user_id__in=user_ids, quantity__gt=0)
+        .values('user_id', 'vegetable__rarity')
+        .annotate(items=Sum('quantity'), value=Sum(F('quantity') * F('vegetable__price')))
+    )
+    for row in holdings:
+        values = stats[row['user_id']]
+        values['inventory_value'] += row['value']
+        values['inventory_items'] += row['items']
+        values[RARITY_FIELDS[row['vegetable__rarity']]] += row['items']
+
+    ledger = (
+        LedgerEntry.objects.filter(user_id__in=user_ids)
+        .values('user_id')
+        .annotate(
+            net_profit=Coalesce(Sum('amount', filter=Q(kind__in=['open', 'sell'])), 0),
+            total_deposited=Coalesce(Sum('amount', filter=Q(kind='deposit')), 0),
+        )
+    )
+    for row in ledger:
+        stats[row['user_id']].update(net_profit=row['net_profit'], total_deposited=row['total_deposited'])
+
+    return stats
+
+
+def stale_user_stats(user_ids):
+    """Return ``(missing, changed)`` unsaved ``UserStats`` whose stored values differ from a recompute."""
+    existing = {stats.user_id: stats for stats in UserStats.objects.select_for_update().filter(user_id__in=user_ids)}
+    computed = compute_user_stats(user_ids)
+
+    missing = [UserStats(user_id=user_id, **values) for user_id, values in computed.items() if user_id not in existing]
+    changed = []
+    for user_id, stats in existing.items():
+        values = computed[user_id]
+        if any(getattr(stats, field) != value for field, value in values.items()):
+            for field, value in values.items():
+                setattr(stats, field, value)
+            changed.append(stats)
+    return missing, changed
+
+
+def rebuild_user_stats(user_ids):
+    """Overwrite the derived columns for ``user_ids``; returns how many rows changed."""
+    with transaction.atomic():
+        # Locking the rows first means a concurrent open/sell applies its delta on top of the rebuilt value.
+        missing, changed = stale_user_stats(user_ids)
+        UserStats.objects.bulk_create(missing)
+        UserStats.objects.bulk_update(changed, DERIVED_FIELDS)
+        # The hot state carries the inventory totals without a version bump to supersede them.
+        rebuilt = [stats.user_id for stats in missing + changed]
+        transaction.on_commit(lambda: invalidate_states(rebuilt))
+    return len(missing) + len(changed)
+
+
+def get_leaderboard(by, limit):
+    """Top ``limit`` users by ``by``; an index range scan, cached for ``LEADERBOARD_CACHE_TIMEOUT`` seconds."""
+    cache_key = f'stats:leaderboard:{by}:{limit}'
+    leaderboard = cache.get(cache_key)
+
+    if leaderboard is None:
+        field = LEADERBOARD_ORDERINGS[by]
+        rows = (
+            UserStats.objects.filter(**{f'{field}__gt': 0})
+            .order_by(f'-{field}', 'user_id')
+            .values('user__username', *LEADERBOARD_FIELDS)[:limit]
+        )
+        leaderboard = [
+            {'rank': rank, 'username': row.pop('user__username'), **row}
+            for rank, row in enumerate(rows, start=1)
+        ]
+        cache.set(cache_key, leaderboard, settings.LEADERBOARD_CACHE_TIMEOUT)
+
+    return leaderboard
@@ -1,3 +1,839 @@
-from django.test import TestCase
+import csv
+import io
+import itertools
+import json
+import math
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+from collections import Counter
+from contextlib import closing
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db.models import F
+from django.test import AsyncRequestFactory, SimpleTestCase, TestCase, TransactionTestCase
+from django.utils import timezone
+
+from . import async_views, history, metrics, rendering, throttling
+from .catalogue import get_catalogue
+from .droptables import AliasTable, get_drop_table
+from .economy import economy_report
+from .events import issue_ticket, ticket_user_id
+from .history import record_drops
+from .hotstate import get_state, refresh_state, stale_states, state_cache, state_key
+from .jobs import HANDLERS, run_jobs
+from .models import Case, CaseVegetable, DropEvent, Inventory, Job, LedgerEntry, Profile, UserStats, Vegetable
+from .rng import derive_uniforms, hash_server_seed
+from .serializers import CustomTokenObtainPairSerializer
+from .stats import rebuild_user_stats
+from .views import add_to_inventory
+from .wallet import InsufficientFunds, credit, debit
+
+
+def insert_orphan_drop(payloads):
+    # Valid until COMMIT, where the deferred foreign key check fails.
+    DropEvent.objects.create(user_id=10 ** 9, price=1)
+
+
+class AliasTableTests(SimpleTestCase):
+
+    def test_columns_carry_the_weights(self):
+        weights = [10, 5, 3, 2, 1, 0]
+        table = AliasTable(weights)
+
+        # Column i keeps prob[i] of its 1/n share and gives the rest to alias[i].
+        mass = [0.0] * len(weights)
+        for i, (prob, alias) in enumerate(zip(table.prob, table.alias)):
+            mass[i] += prob / len(table)
+            mass[alias] += (1 - prob) / len(table)
+        for got, weight in zip(mass, weights):
+            self.assertAlmostEqual(got, weight / sum(weights))
+
+    def test_draws_follow_the_weights(self):
+        weights = [7, 2, 1]
+        table = AliasTable(weights)
+        draws = Counter(table.draw_many(100_000, random.Random(0)))
+
+        for i, weight in enumerate(weights):
+            self.assertAlmostEqual(draws[i] / 100_000, weight / sum(weights), delta=0.01)
+
+
+class ApiTestCase(TestCase):
+    """Signed in as ``self.user``, with fresh throttle buckets."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice')
+        token = CustomTokenObtainPairSerializer.get_token(self.user).access_token
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+        patcher = mock.patch.object(throttling, '_store', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def balance(self):
+        return Profile.objects.get(user=self.user).balance
+
+
+class WalletTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice')
+
+    def test_debit(self):
+        credit(self.user, 100, 'deposit')
+        entry = debit(self.user, 100, 'open')
+
+        self.assertEqual(entry.balance_after, 0)
+        self.assertEqual(list(self.user.ledger.order_by('pk').values_list('kind', 'amount')), [('deposit', 100), ('open', -100)])
+
+    def test_overdraft(self):
+        credit(self.user, 100, 'deposit')
+
+        with self.assertRaises(InsufficientFunds):
+            debit(self.user, 101, 'open')
+
+        self.assertEqual(Profile.objects.get(user=self.user).balance, 100)
+        self.assertEqual(self.user.ledger.count(), 1)
+
+
+class DeletedUserTests(ApiTestCase):
+    # The token stays valid after the user is deleted; stateless authentication never loads the user.
+
+    def setUp(self):
+        super().setUp()
+        self.user.delete()
+
+    def assertUserNotFound(self, response):
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json(), {'detail': 'User not found'})
+        self.assertIn('WWW-Authenticate', response)
+
+    def test_profile(self):
+        self.assertUserNotFound(self.client.get('/api/profile/'))
+
+    def test_me(self):
+        self.assertUserNotFound(self.client.get('/api/auth/me/'))
+
+    def test_deposit(self):
+        self.assertUserNotFound(self.client.post('/api/profile/deposit/', {'amount': 100}))
+
+    def test_stats(self):
+        self.assertUserNotFound(self.client.get('/api/profile/stats/'))
+
+    def test_open(self):
+        case = Case.objects.create(name='Кейс', price=10)
+        case.vegetables.add(Vegetable.objects.create(name='Кабачок'))
+
+        self.assertUserNotFound(self.client.post(f'/api/cases/{case.pk}/open/'))
+
+    async def test_async_profile(self):
+        request = AsyncRequestFactory().get('/api/profile/', headers={'Authorization': self.client.defaults['HTTP_AUTHORIZATION']})
+        response = await async_views.profile_list(request)
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.content, b'{"detail":"User not found"}')
+        self.assertIn('WWW-Authenticate', response)
+
+
+class IdempotencyTests(ApiTestCase):
+
+    def deposit(self, amount, key='k1'):
+        return self.client.post('/api/profile/deposit/', {'amount': amount}, headers={'Idempotency-Key': key})
+
+    def test_replay(self):
+        first = self.deposit(100)
+        replay = self.deposit(100)
+
+        self.assertEqual(replay.status_code, 200)
+        self.assertEqual(replay.json(), first.json())
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+        self.assertEqual(self.balance(), 100)
+        self.assertEqual(LedgerEntry.objects.count(), 1)
+
+    def test_key_reused_for_another_request(self):
+        self.deposit(100)
+
+        self.assertEqual(self.deposit(200).status_code, 422)
+        self.assertEqual(self.balance(), 100)
+
+    def test_other_key(self):
+        self.deposit(100)
+        self.deposit(100, key='k2')
+
+        self.assertEqual(self.balance(), 200)
+
+
+class ThrottleTests(ApiTestCase):
+
+    def test_retry_after(self):
+        with self.settings(THROTTLE_BUCKETS={'deposit': {'user': (0.5, 1)}}):
+            self.assertEqual(self.client.post('/api/profile/deposit/', {'amount': 1}).status_code, 200)
+            response = self.client.post('/api/profile/deposit/', {'amount': 1})
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '2')
+        self.assertEqual(self.balance(), 1)
+
+
+class FairnessTests(ApiTestCase):
+
+    def test_derivation(self):
+        # Published proofs depend on this exact derivation; changing it breaks every past verification.
+        self.assertEqual(derive_uniforms('server', 'client', 0, 2), [0.49259923190146415, 0.3125630183777376])
+        self.assertEqual(derive_uniforms('server', 'client', 1), [0.3125630183777376])
+        self.assertEqual(hash_server_seed('server'), 'b3eacd33433b31b5252351032c9b3e7a2e7aa7738d5decdf0dd6c62680853c06')
+
+    def test_revealed_opening_verifies(self):
+        case = Case.objects.create(name='Кейс', price=10)
+        for rarity, _ in Vegetable.RARITY_CHOICES:
+            case.vegetables.add(Vegetable.objects.create(name=rarity, rarity=rarity))
+        credit(self.user, 100, 'deposit')
+
+        opened = self.client.post(f'/api/cases/{case.pk}/open-batch/', {'count': 5}).json()
+        revealed = self.client.post('/api/fairness/rotate/').json()['revealed']
+        verified = self.client.get('/api/fairness/verify/', {
+            'server_seed': revealed['server_seed'],
+            'client_seed': revealed['client_seed'],
+            'nonce': opened['fairness']['nonce'],
+            'count': 5,
+            'case': case.pk,
+        }).json()
+
+        self.assertEqual(verified['server_seed_hash'], opened['fairness']['server_seed_hash'])
+        self.assertEqual(verified['rewards'], opened['rewards'])
+
+
+class AddToInventoryTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice')
+        self.first = Vegetable.objects.create(name='Кабачок')
+        self.second = Vegetable.objects.create(name='Тыква')
+
+    def test_adds_to_existing_rows(self):
+        ids = add_to_inventory(self.user, {self.first.pk: 2})
+        more = add_to_inventory(self.user, {self.first.pk: 3, self.second.pk: 1})
+
+        self.assertEqual(more[self.first.pk], (ids[self.first.pk][0], 5))
+        self.assertEqual(dict(self.user.inventory.values_list('vegetable_id', 'quantity')), {self.first.pk: 5, self.second.pk: 1})
+
+    def test_reuses_sold_out_row(self):
+        ids = add_to_inventory(self.user, {self.first.pk: 1})
+        acquired_at = Inventory.objects.get().acquired_at
+        Inventory.objects.update(quantity=0)
+
+        self.assertEqual(add_to_inventory(self.user, {self.first.pk: 1}), ids)
+        self.assertEqual(list(Inventory.objects.values_list('quantity', 'acquired_at')), [(1, acquired_at)])
+
+    def test_compact_inventory(self):
+        third = Vegetable.objects.create(name='Морковь')
+        ids = add_to_inventory(self.user, {self.first.pk: 1, self.second.pk: 1, third.pk: 2})
+        Inventory.objects.filter(vegetable__in=[self.first, self.second]).update(quantity=0)
+        out = io.StringIO()
+
+        # Batches smaller than the sold-out rows walk them all.
+        call_command('compact_inventory', batch_size=1, stdout=out)
+
+        self.assertEqual(list(Inventory.objects.values_list('pk', 'quantity')), [ids[third.pk]])
+        self.assertIn('Удалено пустых строк: 2', out.getvalue())
+        self.assertEqual(add_to_inventory(self.user, {self.first.pk: 1})[self.first.pk][1], 1)
+
+
+class OpenBatchTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.case = Case.objects.create(name='Кейс', price=10)
+        self.case.vegetables.add(Vegetable.objects.create(name='Кабачок'), Vegetable.objects.create(name='Тыква', rarity='rare'))
+        credit(self.user, 100, 'deposit')
+
+    def open(self, count):
+        return self.client.post(f'/api/cases/{self.case.pk}/open-batch/', {'count': count})
+
+    def test_debit_and_rewards(self):
+        response = self.open(4)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['rewards']), 4)
+        self.assertEqual(response.json()['new_balance'], 60)
+        self.assertEqual(self.balance(), 60)
+        self.assertEqual(list(self.user.ledger.filter(kind='open').values_list('amount', flat=True)), [-40])
+        self.assertEqual(sum(Inventory.objects.filter(user=self.user).values_list('quantity', flat=True)), 4)
+        self.assertEqual(UserStats.objects.get(user=self.user).cases_opened, 4)
+
+    def test_insufficient_funds(self):
+        self.assertEqual(self.open(11).status_code, 400)
+
+        self.assertEqual(self.balance(), 100)
+        self.assertFalse(Inventory.objects.filter(user=self.user).exists())
+
+    def test_bad_count(self):
+        for count in (0, 101, 'x'):
+            with self.subTest(count=count):
+                self.assertEqual(self.open(count).status_code, 400)
+
+        self.assertEqual(self.balance(), 100)
+
+
+class InventoryListTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        prices = {'common': 5, 'rare': 20}
+        vegetables = [Vegetable.objects.create(name=f'Овощ {i}', rarity=rarity, price=prices[rarity]) for i, rarity in enumerate(['common', 'rare'] * 3)]
+        rows = add_to_inventory(self.user, {vegetable.pk: 2 for vegetable in vegetables})
+        # Sold out: kept in the table, left out of the list.
+        self.sold_out = rows[vegetables[0].pk][0]
+        Inventory.objects.filter(pk=self.sold_out).update(quantity=0)
+        rebuild_user_stats([self.user.pk])
+        self.expected = sorted((pk for pk, quantity in rows.values() if pk != self.sold_out), reverse=True)
+
+    def test_pages(self):
+        ids = []
+        url = '/api/inventory/?page_size=2'
+        while url:
+            data = self.client.get(url).json()
+            self.assertLessEqual(len(data['results']), 2)
+            self.assertEqual((data['total_items'], data['total_value']), (10, 140))
+            ids += [row['id'] for row in data['results']]
+            url = data['next']
+
+        self.assertEqual(ids, self.expected)
+
+    def test_rarity(self):
+        data = self.client.get('/api/inventory/', {'rarity': 'common'}).json()
+
+        self.assertEqual({row['vegetable']['rarity'] for row in data['results']}, {'common'})
+        self.assertEqual(len(data['results']), 2)
+        self.assertEqual((data['total_items'], data['total_value']), (4, 20))
+
+
+class SellBatchTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.common = Vegetable.objects.create(name='Кабачок', rarity='common', price=5)
+        self.rare = Vegetable.objects.create(name='Тыква', rarity='rare', price=20)
+        rows = add_to_inventory(self.user, {self.common.pk: 3, self.rare.pk: 2})
+        rebuild_user_stats([self.user.pk])
+        self.common_row, self.rare_row = rows[self.common.pk][0], rows[self.rare.pk][0]
+
+    def sell(self, data):
+        return self.client.post('/api/inventory/sell-batch/', data, content_type='application/json')
+
+    def quantities(self):
+        return dict(Inventory.objects.filter(user=self.user).values_list('id', 'quantity'))
+
+    def test_items(self):
+        response = self.sell({'items': [{'id': self.common_row, 'quantity': 2}, {'id': self.rare_row}]})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['sold'], response.json()['payout']), (3, 30))
+        self.assertEqual(self.quantities(), {self.common_row: 1, self.rare_row: 1})
+        self.assertEqual(self.balance(), 30)
+        self.assertEqual(list(self.user.ledger.values_list('kind', 'amount')), [('sell', 30)])
+        stats = UserStats.objects.get(user=self.user)
+        self.assertEqual((stats.inventory_items, stats.inventory_value, stats.net_profit), (2, 25, 30))
+        self.assertEqual((stats.common_count, stats.rare_count), (1, 1))
+
+    def test_rarity_sells_down_to_zero(self):
+        response = self.sell({'rarity': 'rare'})
+
+        self.assertEqual(response.json()['payout'], 40)
+        self.assertEqual(self.quantities(), {self.common_row: 3, self.rare_row: 0})
+        self.assertEqual([change['quantity'] for change in response.json()['inventory']], [0])
+        self.assertEqual(UserStats.objects.get(user=self.user).rare_count, 0)
+        self.assertEqual(self.sell({'rarity': 'rare'}).status_code, 400)
+
+    def test_rejected(self):
+        for data in (
+            {'items': [{'id': self.common_row, 'quantity': 4}]},
+            {'items': [{'id': self.common_row}, {'id': self.common_row}]},
+            {'items': [{'id': self.common_row, 'quantity': 1.5}]},
+            {'items': [{'id': self.common_row, 'quantity': 0}]},
+            {},
+        ):
+            with self.subTest(data=data):
+                self.assertEqual(self.sell(data).status_code, 400)
+
+        self.assertEqual(self.quantities(), {self.common_row: 3, self.rare_row: 2})
+        self.assertEqual(self.balance(), 0)
+        self.assertFalse(self.user.ledger.exists())
+
+
+class DropExportTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.start = timezone.now().replace(microsecond=0)
+        self.case = Case.objects.create(name='Кейс')
+        self.vegetable = Vegetable.objects.create(name='Кабачок', price=7)
+        bob = User.objects.create_user('bob')
+        history.record_drop_batch([self.payload(self.user, 1, 1, None), self.payload(self.user, 0, 2, 10), self.payload(bob, 0, 1, 0)])
+
+    def payload(self, user, hours, count, nonce):
+        return {
+            'user_id': user.pk,
+            'case_id': self.case.pk,
+            'nonce': nonce,
+            'created_at': (self.start + timezone.timedelta(hours=hours)).isoformat(),
+            'drops': [[self.vegetable.pk, self.vegetable.price]] * count,
+        }
+
+    def export(self, **params):
+        response = self.client.get('/api/drops/export/', params)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_ndjson(self):
+        rows = [json.loads(line) for line in self.export(output='ndjson').splitlines()]
+
+        self.assertEqual({row['user_id'] for row in rows}, {self.user.pk})
+        self.assertEqual([row['nonce'] for row in rows], [10, 11, None])
+        self.assertEqual(rows[0]['vegetable__name'], 'Кабачок')
+        since = (self.start + timezone.timedelta(minutes=30)).isoformat()
+        self.assertEqual(len(self.export(output='ndjson', since=since).splitlines()), 1)
+
+    def test_bad_parameters(self):
+        for params in ({'output': 'xml'}, {'since': 'yesterday'}, {'case': 'x'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get('/api/drops/export/', params).status_code, 400)
+
+    def test_command(self):
+        out = io.StringIO()
+        call_command('export_drops', user=self.user.pk, stdout=out)
+
+        rows = list(csv.reader(io.StringIO(out.getvalue())))
+        self.assertEqual(rows[0], list(history.EXPORT_FIELDS))
+        self.assertEqual(len(rows), 4)
+
+    async def test_async_chunks_match_the_sync_export(self):
+        queryset = history.export_queryset(user_id=self.user.pk)
+        with mock.patch.object(history, 'FLUSH_BYTES', 1):
+            chunks = [chunk async for chunk in history.aexport_rows(queryset, 'ndjson')]
+            expected = await sync_to_async(lambda: list(history.export_rows(queryset, 'ndjson')))()
+
+        # A chunk per row once a row fills the buffer.
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(chunks, expected)
+
+
+class InventoryChangeTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.vegetable = Vegetable.objects.create(name='Кабачок', price=7)
+        self.case = Case.objects.create(name='Кейс', price=10)
+        self.case.vegetables.add(self.vegetable)
+        credit(self.user, 100, 'deposit')
+
+    def change(self, response):
+        [change] = response.json()['inventory']
+        return {key: change[key] for key in ('id', 'quantity', 'delta', 'price', 'version')}
+
+    def test_versions_follow_the_ledger(self):
+        opened = self.change(self.client.post(f'/api/cases/{self.case.pk}/open/'))
+        row = Inventory.objects.get(user=self.user)
+        sold = self.change(self.client.post(f'/api/inventory/{row.pk}/sell/'))
+
+        versions = list(self.user.ledger.order_by('pk').values_list('pk', flat=True))
+        self.assertEqual(opened, {'id': row.pk, 'quantity': 1, 'delta': 1, 'price': 7, 'version': versions[1]})
+        self.assertEqual(sold, {'id': row.pk, 'quantity': 0, 'delta': -1, 'price': 7, 'version': versions[2]})
+
+
+class RunJobsTests(TransactionTestCase):
+    # A deleted foreign key only fails at COMMIT, which TestCase never reaches.
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice')
+        self.vegetable = Vegetable.objects.create(name='Кабачок', price=10)
+        self.case = Case.objects.create(name='Кейс', price=10)
+
+    def test_rows_deleted_before_the_worker(self):
+        other = User.objects.create_user('bob')
+        record_drops(self.user, self.case, [self.vegetable])
+        record_drops(other, self.case, [self.vegetable])
+        self.user.delete()
+        self.case.delete()
+
+        self.assertEqual(run_jobs(), 2)
+
+        self.assertFalse(Job.objects.exists())
+        self.assertEqual(list(DropEvent.objects.values_list('user_id', 'case_id', 'vegetable_id')), [(other.pk, None, self.vegetable.pk)])
+
+    @mock.patch.dict(HANDLERS, {'test.orphan': 'cases.tests.insert_orphan_drop'})
+    def test_failure_at_commit_is_retried_later(self):
+        Job.objects.create(kind='test.orphan', payload={})
+
+        with self.assertLogs('cases.jobs', 'ERROR'):
+            self.assertEqual(run_jobs(), 1)
+
+        job = Job.objects.get()
+        self.assertEqual(job.attempts, 1)
+        self.assertIn('IntegrityError', job.last_error)
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIsNone(job.failed_at)
+
+    def test_bad_payload_does_not_hold_back_the_batch(self):
+        record_drops(self.user, self.case, [self.vegetable])
+        bad = Job.objects.create(kind='drops.record', payload={'user_id': self.user.pk})
+        record_drops(self.user, self.case, [self.vegetable])
+
+        with self.settings(JOBS_MAX_ATTEMPTS=1), self.assertLogs('cases.jobs', 'ERROR'):
+            self.assertEqual(run_jobs(), 3)
+
+        self.assertEqual(DropEvent.objects.count(), 2)
+        self.assertEqual(list(Job.objects.values_list('pk', 'attempts')), [(bad.pk, 1)])
+        self.assertIsNotNone(Job.objects.get().failed_at)
+
+
+class EventTicketTests(SimpleTestCase):
+
+    def test_ticket_names_the_user(self):
+        self.assertEqual(ticket_user_id(issue_ticket(42)), 42)
+
+    def test_tampered_ticket(self):
+        with self.assertRaises(signing.BadSignature):
+            ticket_user_id(issue_ticket(42)[:-1])
+
+    def test_expired_ticket(self):
+        ticket = issue_ticket(42)
+        with self.settings(EVENTS_TICKET_MAX_AGE=-1), self.assertRaises(signing.SignatureExpired):
+            ticket_user_id(ticket)
+
+
+class CatalogueTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.vegetable = Vegetable.objects.create(name='Кабачок', price=10)
+        self.case = Case.objects.create(name='Кейс', price=10)
+        self.case.vegetables.add(self.vegetable)
+
+    def test_edit_in_another_process(self):
+        body, etag = get_catalogue()
+        # What an admin edit handled by another worker leaves behind: new rows, this cache untouched.
+        Case.objects.filter(pk=self.case.pk).update(price=99, drop_table_version=F('drop_table_version') + 1)
+
+        new_body, new_etag = get_catalogue()
+        self.assertNotEqual(new_etag, etag)
+        self.assertIn(b'"price":99', new_body)
+
+    def test_vegetable_edit(self):
+        get_catalogue()
+        self.vegetable.price = 77
+        self.vegetable.save()
+
+        self.assertIn(b'"price":77', get_catalogue()[0])
+
+
+class AsyncViewTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice')
+        token = CustomTokenObtainPairSerializer.get_token(self.user).access_token
+        self.headers = {'Authorization': f'Bearer {token}'}
+
+    async def test_bad_cursor_is_a_json_404(self):
+        request = AsyncRequestFactory().get('/api/inventory/', {'cursor': 'garbage'}, headers=self.headers)
+        response = await async_views.inventory_list(request)
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.content, b'{"detail":"Invalid cursor"}')
+
+
+class DropChanceTests(TestCase):
+
+    def setUp(self):
+        self.case = Case.objects.create(name='Кейс')
+        self.common = Vegetable.objects.create(name='Кабачок', rarity='common')
+        self.rare = Vegetable.objects.create(name='Тыква', rarity='rare')
+        self.case.vegetables.add(self.common, self.rare)
+
+    def chances(self):
+        return dict(CaseVegetable.objects.filter(case=self.case).values_list('vegetable_id', 'probability'))
+
+    def assertChances(self, common, rare):
+        chances = self.chances()
+        self.assertAlmostEqual(chances[self.common.pk], common)
+        self.assertAlmostEqual(chances[self.rare.pk], rare)
+        self.case.refresh_from_db()
+        self.assertEqual(get_drop_table(self.case).weights, [chances[self.common.pk], chances[self.rare.pk]])
+
+    def test_rarity_weights(self):
+        self.assertChances(10 / 13, 3 / 13)
+
+    def test_weight_edit(self):
+        entry = CaseVegetable.objects.get(case=self.case, vegetable=self.common)
+        entry.weight = 3
+        entry.save()
+
+        self.assertChances(0.5, 0.5)
+
+    def test_rarity_edit(self):
+        get_drop_table(self.case)
+        self.rare.rarity = 'legendary'
+        self.rare.save()
+
+        self.assertChances(10 / 11, 1 / 11)
+
+    def test_removal(self):
+        self.case.vegetables.remove(self.rare)
+
+        self.assertEqual(self.chances(), {self.common.pk: 1.0})
+
+
+class EconomyReportTests(TestCase):
+
+    def test_matches_enumeration(self):
+        cache.clear()
+        case = Case.objects.create(name='Кейс', price=10)
+        drops = {Vegetable.objects.create(name='Кабачок', rarity='common', price=4): 10, Vegetable.objects.create(name='Тыква', rarity='rare', price=30): 3}
+        case.vegetables.add(*drops)
+        report = economy_report(case, openings=3)
+
+        chances = {vegetable.price: weight / sum(drops.values()) for vegetable, weight in drops.items()}
+        totals = Counter()
+        for outcome in itertools.product(chances, repeat=3):
+            totals[sum(outcome)] += math.prod(chances[price] for price in outcome)
+        ev = sum(price * chance for price, chance in chances.items())
+
+        self.assertAlmostEqual(report['ev'], ev)
+        self.assertAlmostEqual(report['variance'], sum(price ** 2 * chance for price, chance in chances.items()) - ev ** 2)
+        self.assertAlmostEqual(report['rtp'], ev / 10)
+        self.assertAlmostEqual(report['p_break_even'], sum(chance for total, chance in totals.items() if total >= 30))
+        cumulative = list(itertools.accumulate(totals[total] for total in sorted(totals)))
+        for q, rtp in report['rtp_quantiles'].items():
+            expected = next(total for total, reached in zip(sorted(totals), cumulative) if reached >= q / 100)
+            self.assertEqual(rtp, expected / 30)
+
+
+class LeaderboardTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        cheap = Vegetable.objects.create(name='Кабачок', price=5)
+        dear = Vegetable.objects.create(name='Тыква', rarity='epic', price=50)
+        self.users = {name: User.objects.create_user(name) for name in ('bob', 'carol', 'dave', 'erin')}
+        add_to_inventory(self.users['bob'], {cheap.pk: 2})
+        add_to_inventory(self.users['carol'], {dear.pk: 1, cheap.pk: 1})
+        add_to_inventory(self.users['dave'], {cheap.pk: 11})
+        for name, opened, sold in (('bob', 30, 100), ('carol', 200, 0), ('dave', 10, 20)):
+            credit(self.users[name], 500, 'deposit')
+            debit(self.users[name], opened, 'open')
+            if sold:
+                credit(self.users[name], sold, 'sell')
+        self.assertEqual(rebuild_user_stats([user.pk for user in self.users.values()]), 3)
+
+    def leaderboard(self, by):
+        return [(row['rank'], row['username']) for row in self.client.get('/api/leaderboard/', {'by': by}).json()]
+
+    def test_ordering(self):
+        # carol 55, dave 55 (ties by user id), bob 10; erin holds nothing and is left out.
+        self.assertEqual(self.leaderboard('value'), [(1, 'carol'), (2, 'dave'), (3, 'bob')])
+        self.assertEqual(self.leaderboard('profit'), [(1, 'bob'), (2, 'dave')])
+
+    def test_bad_parameters(self):
+        for params in ({'by': 'balance'}, {'limit': 0}, {'limit': 101}, {'limit': 'x'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get('/api/leaderboard/', params).status_code, 400)
+
+    def test_rebuild_user_stats(self):
+        carol = self.users['carol']
+        UserStats.objects.filter(user=carol).update(inventory_value=0, epic_count=7, net_profit=1, total_deposited=0)
+
+        self.assertEqual(rebuild_user_stats([carol.pk, self.users['bob'].pk]), 1)
+        stats = UserStats.objects.get(user=carol)
+        self.assertEqual(
+            (stats.inventory_value, stats.inventory_items, stats.epic_count, stats.common_count, stats.net_profit, stats.total_deposited),
+            (55, 2, 1, 1, -200, 500),
+        )
+
+
+class HotStateTests(TestCase):
+
+    def setUp(self):
+        self.enterContext(self.settings(HOTSTATE_CACHES=['default'], HOTSTATE_CHECK=False))
+        cache.clear()
+        self.user = User.objects.create_user('alice')
+        self.vegetable = Vegetable.objects.create(name='Кабачок', price=7)
+
+    def cached(self):
+        return state_cache(self.user.pk).get(state_key(self.user.pk))
+
+    def test_read_through(self):
+        state = get_state(self.user.pk)
+
+        self.assertEqual(self.cached(), state)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_state(self.user.pk), state)
+
+    def test_write_through_keeps_the_newest_version(self):
+        get_state(self.user.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            credit(self.user, 100, 'deposit')
+        newest = self.cached()
+
+        self.assertEqual(newest['profile']['balance'], 100)
+        # A refresh that loaded an older version than the cached one leaves it be.
+        Profile.objects.filter(user=self.user).update(version=F('version') - 1, balance=0)
+        refresh_state(self.user.pk)
+        self.assertEqual(self.cached(), newest)
+
+    def test_profile_save_invalidates(self):
+        get_state(self.user.pk)
+        profile = Profile.objects.get(user=self.user)
+        profile.balance = 50
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.save()
+
+        self.assertIsNone(self.cached())
+        self.assertEqual(get_state(self.user.pk)['profile']['balance'], 50)
+
+    def test_inventory_changed_behind_the_stats(self):
+        add_to_inventory(self.user, {self.vegetable.pk: 2})
+        rebuild_user_stats([self.user.pk])
+        get_state(self.user.pk)
+        self.assertEqual(stale_states([self.user.pk]), [])
+
+        Inventory.objects.filter(user=self.user).update(quantity=5)
+
+        self.assertEqual(stale_states([self.user.pk]), [self.user.pk])
+        with self.settings(HOTSTATE_CHECK=True), self.assertLogs('cases.hotstate', 'WARNING'):
+            self.assertEqual(get_state(self.user.pk)['totals'], {'total_items': 5, 'total_value': 35})
+        self.assertIsNone(self.cached())
+
+
+class QueryMetricsTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        Case.objects.create(name='Кейс', price=10)
+        override = self.settings(MIDDLEWARE=['cases.metrics.QueryMetricsMiddleware', *settings.MIDDLEWARE])
+        override.enable()
+        self.addCleanup(override.disable)
+        patcher = mock.patch.object(metrics, 'registry', metrics.Registry())
+        self.registry = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def recorded_queries(self):
+        histogram = self.registry.histograms[('kabachok_request_db_queries', 'CaseViewSet.list')]
+        return histogram.count, histogram.sum
+
+    def test_sync(self):
+        self.client.get('/api/cases/')
+
+        count, queries = self.recorded_queries()
+        self.assertEqual(count, 1)
+        self.assertGreater(queries, 0)
+
+    def test_no_thread_hop_under_asgi(self):
+        async def get_response(request):
+            pass
+
+        self.assertTrue(iscoroutinefunction(metrics.QueryMetricsMiddleware(get_response)))
+
+    async def test_async(self):
+        # The ORM runs in a sync_to_async thread, not in the middleware's.
+        await self.async_client.get('/api/cases/')
+
+        count, queries = self.recorded_queries()
+        self.assertEqual(count, 1)
+        self.assertGreater(queries, 0)
+
+    def test_endpoint_needs_the_token(self):
+        for token, authorization, status in (('', '', 403), ('', 'Bearer ', 403), ('s3cret', 'Bearer x', 403), ('s3cret', 'Bearer s3cret', 200)):
+            with self.subTest(token=token, authorization=authorization), self.settings(METRICS_ENABLED=True, METRICS_TOKEN=token):
+                self.assertEqual(self.client.get('/api/metrics/', headers={'Authorization': authorization}).status_code, status)
+
+
+class SpaIndexTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        index = Path(directory.name, 'index.html')
+        index.write_text('<!doctype html><div id="root"></div>')
+        settings = self.settings(SPA_INDEX_FILE=str(index))
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_frame_options(self):
+        response = self.client.get('/some/route')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Frame-Options'], 'DENY')
+
+    def test_revalidation(self):
+        etag = self.client.get('/some/route')['ETag']
+
+        self.assertEqual(self.client.get('/some/route', headers={'If-None-Match': etag}).status_code, 304)
+        self.assertEqual(self.client.get('/some/route', headers={'If-None-Match': f'"x{etag[1:]}'}).status_code, 200)
+
+
+class VegetableMemoTests(TestCase):
+
+    def setUp(self):
+        rendering._vegetables.clear()
+        self.addCleanup(rendering._vegetables.clear)
+
+    @mock.patch.object(rendering, 'MEMO_MAX_SIZE', 3)
+    def test_overflow_keeps_the_requested_vegetables(self):
+        vegetables = [Vegetable.objects.create(name=f'Овощ {i}') for i in range(4)]
+        versions = {vegetable.pk: vegetable.version for vegetable in vegetables}
+
+        rendering.vegetable_dicts(dict(list(versions.items())[:3]))
+        dicts = rendering.vegetable_dicts(versions)
+
+        self.assertEqual(sorted(dicts), sorted(versions))
+
+
+BASELINE_ROWS = """
+INSERT INTO auth_user (password, last_login, is_superuser, username, first_name, last_name, email, is_staff, is_active, date_joined)
+    VALUES ('', NULL, 0, 'alice', '', '', '', 0, 1, '2024-01-01 00:00:00');
+INSERT INTO cases_vegetable (name, emoji, rarity, description, price) VALUES ('Кабачок', '🥒', 'common', '', 10), ('Тыква', '🎃', 'legendary', '', 500);
+INSERT INTO cases_case (name, description, price, image_url, is_active) VALUES ('Кейс', '', 100, '', 1);
+INSERT INTO cases_case_vegetables (case_id, vegetable_id) VALUES (1, 1), (1, 2);
+INSERT INTO cases_profile (balance, created_at, user_id) VALUES (250, '2024-01-01 00:00:00', 1);
+INSERT INTO cases_inventory (quantity, acquired_at, user_id, vegetable_id) VALUES (3, '2024-01-01 00:00:00', 1, 1);
+"""
+
+
+class ImportSqliteTests(SimpleTestCase):
+    # Run as `manage.py` would be: the test database guard only allows the aliases it knows.
+
+    def manage(self, path, *args):
+        env = {**os.environ, 'DJANGO_DB_PATH': path, 'DATABASE_URL': ''}
+        subprocess.run([sys.executable, 'manage.py', *args, '-v0'], cwd=settings.BASE_DIR, env=env, check=True, stdout=subprocess.DEVNULL)
+
+    def test_baseline_database(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        source, target = str(Path(directory.name, 'source.sqlite3')), str(Path(directory.name, 'target.sqlite3'))
+
+        # A database from before the ledger, stats and drop table columns.
+        self.manage(source, 'migrate')
+        self.manage(source, 'migrate', 'cases', '0004')
+        with closing(sqlite3.connect(source)) as db:
+            db.execute('PRAGMA journal_mode = DELETE')
+            db.executescript(BASELINE_ROWS)
+        content = Path(source).read_bytes()
+
+        self.manage(target, 'migrate')
+        self.manage(target, 'import_sqlite', source)
+
+        self.assertEqual(Path(source).read_bytes(), content)
+        with closing(sqlite3.connect(target)) as db:
+            self.assertEqual(db.execute('SELECT username, balance FROM auth_user JOIN cases_profile ON user_id = auth_user.id').fetchall(), [('alice', 250)])
+            self.assertEqual(db.execute('SELECT kind, amount FROM cases_ledgerentry').fetchall(), [('adjustment', 250)])
+            self.assertEqual(db.execute('SELECT inventory_items, inventory_value FROM cases_userstats').fetchall(), [(3, 30)])
+            self.assertEqual(db.execute('SELECT count(*) FROM cases_case_vegetables WHERE probability > 0').fetchone(), (2,))
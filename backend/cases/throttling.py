@@ -0,0 +1,112 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from rest_framework.throttling import BaseThrottle
+
+
+class LocalBucketStore:
+    """
+    Token buckets in process memory: one lock and a dict lookup per check.
+    Limits are per worker process, so the effective limit is multiplied by
+    the number of workers.
+    """
+
+    max_keys = 100_000
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets = {}
+
+    def take(self, key, rate, burst):
+        """Take one token; return 0 if allowed, otherwise seconds until one is available."""
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated, full_at = self.buckets.get(key, (burst, now, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self.buckets[key] = (tokens, now, now + (burst - tokens) / rate)
+
+            if len(self.buckets) > self.max_keys:
+                # A bucket that has refilled completely is the same as a missing one.
+                self.buckets = {k: bucket for k, bucket in self.buckets.items() if bucket[2] > now}
+        return 0 if allowed else (1 - tokens) / rate
+
+
+class CacheBucketStore:
+    """
+    Token buckets in a Django cache shared by all workers (e.g. Redis or
+    memcached via ``THROTTLE_CACHE``). The read-modify-write is not atomic,
+    so concurrent requests can occasionally both take the last token; with
+    the local-memory cache it doubles as a single-process test store.
+    """
+
+    def __init__(self):
+        self.cache = caches[settings.THROTTLE_CACHE]
+
+    def take(self, key, rate, burst):
+        now = time.time()
+        cache_key = f'throttle:{key}'
+        tokens, updated = self.cache.get(cache_key, (burst, now))
+        tokens = min(burst, tokens + (now - updated) * rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        self.cache.set(cache_key, (tokens, now), int(burst / rate) + 1)
+        return 0 if allowed else (1 - tokens) / rate
+
+
+_store = None
+
+
+def get_store():
+    global _store
+    if _store is None:
+        _store = import_string(settings.THROTTLE_STORE)()
+    return _store
+
+
+def user_tier(user):
+    if not user or not user.is_authenticated:
+        return 'anon'
+    token = getattr(user, 'token', None)
+    if token is not None:
+        return token.get('tier', 'user')
+    return 'staff' if user.is_staff else 'user'
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Throttles the actions a viewset maps in ``throttle_scopes`` using the
+    ``THROTTLE_BUCKETS`` for that scope: a bucket per user for their tier,
+    then a ``global`` bucket shared by everyone.
+    """
+
+    def allow_request(self, request, view):
+        scope = getattr(view, 'throttle_scopes', {}).get(getattr(view, 'action', None))
+        buckets = settings.THROTTLE_BUCKETS.get(scope)
+        if not buckets:
+            return True
+
+        tier = user_tier(request.user)
+        ident = request.user.pk if request.user and request.user.is_authenticated else self.get_ident(request)
+        checks = [
+            (f'{scope}:{tier}:{ident}', buckets.get(tier, buckets.get('user'))),
+            (f'{scope}:global', buckets.get('global')),
+        ]
+
+        store = get_store()
+        for key, limit in checks:
+            if limit is None:
+                continue
+            self.retry_after = store.take(key, *limit)
+            if self.retry_after:
+                return False
+        return True
+
+    def wait(self):
+        return self.retry_after
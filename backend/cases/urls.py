@@ -1,12 +1,16 @@
-from django.urls import path, include
+from django.conf import settings
+from django.urls import path, re_path, include
 from rest_framework.routers import DefaultRouter
 from rest_framework_simplejwt.views import TokenRefreshView
-from .views import CaseViewSet, RegisterView, CustomTokenObtainPairView, UserDetailView, ProfileViewSet, InventoryViewSet
+from . import async_views
+from .metrics import metrics_view
+from .views import CaseViewSet, RegisterView, CustomTokenObtainPairView, UserDetailView, ProfileViewSet, InventoryViewSet, LeaderboardView, FairnessViewSet, DropExportView, EventTicketView
 
 router = DefaultRouter()
 router.register(r'cases', CaseViewSet, basename='case')
 router.register(r'profile', ProfileViewSet, basename='profile')
 router.register(r'inventory', InventoryViewSet, basename='inventory')
+router.register(r'fairness', FairnessViewSet, basename='fairness')
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -14,4 +18,31 @@ urlpatterns = [
     path('auth/login/', CustomTokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('auth/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('auth/me/', UserDetailView.as_view(), name='user_detail'),
-]
\ No newline at end of file
+    path('leaderboard/', LeaderboardView.as_view(), name='leaderboard'),
+    path('drops/export/', DropExportView.as_view(), name='drop_export'),
+    path('metrics/', metrics_view, name='metrics'),
+]
+
+if settings.EVENTS_ENABLED:
+    urlpatterns += [
+        path('events/', async_views.events, name='events'),
+        path('events/ticket/', EventTicketView.as_view(), name='events_ticket'),
+    ]
+
+if settings.ASYNC_READ_VIEWS:
+    urlpatterns = [
+        path('cases/', async_views.with_async_reads(
+            async_views.case_list, CaseViewSet.as_view({'get': 'list', 'post': 'create'}),
+        )),
+        re_path(r'^cases/(?P<pk>[^/.]+)/$', async_views.with_async_reads(
+            async_views.case_detail,
+            CaseViewSet.as_view({'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy'}),
+        )),
+        path('inventory/', async_views.with_async_reads(
+            async_views.inventory_list, InventoryViewSet.as_view({'get': 'list'}),
+        )),
+        path('profile/', async_views.with_async_reads(
+            async_views.profile_list, ProfileViewSet.as_view({'get': 'list'}),
+        )),
+        path('auth/me/', async_views.with_async_reads(async_views.user_detail, UserDetailView.as_view())),
+    ] + urlpatterns
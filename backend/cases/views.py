@@ -3,11 +3,86 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework_simplejwt.views import TokenObtainPairView
-import random
+from collections import Counter
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.db import transaction
-from .models import Case, Vegetable, Profile, Inventory
-from .serializers import CaseSerializer, VegetableSerializer, UserSerializer, RegisterSerializer, CustomTokenObtainPairSerializer, ProfileSerializer, InventorySerializer
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connection, transaction
+from django.db.models import F, Sum, Value, When, Case as CaseWhen
+from django.db.models.functions import Coalesce
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .models import Case, Inventory, SeedPair, UserStats
+from .authentication import UserNotFound
+from .catalogue import catalogue_response, get_catalogue
+from .droptables import get_drop_table
+from .events import issue_ticket, publish_balance, publish_drops, publish_inventory
+from .history import EXPORT_FORMATS, aexport_rows, export_queryset, export_rows, record_drops
+from .hotstate import get_state
+from .idempotency import idempotent
+from .pagination import InventoryCursorPagination
+from .rendering import case_rows, inventory_rows, inventory_values
+from .rng import active_seed_pair, derive_uniforms, get_rng, hash_server_seed, rotate_seed_pair
+from .stats import LEADERBOARD_ORDERINGS, get_leaderboard, record_deposit, record_open, record_sale
+from .wallet import InsufficientFunds, credit, debit
+from .serializers import CaseSerializer, VegetableSerializer, UserSerializer, RegisterSerializer, CustomTokenObtainPairSerializer, ProfileSerializer, InventorySerializer, UserStatsSerializer, SeedPairSerializer, RevealedSeedPairSerializer
+
+MAX_BATCH_OPEN = 100
+MAX_LEADERBOARD = 100
+
+
+def add_to_inventory(user, counts):
+    """
+    Add ``counts`` ({vegetable_id: quantity}) to the user's inventory in one
+    upsert; returns {vegetable_id: (inventory id, new quantity)}. Rows sold down to zero are
+    reused and keep their ``acquired_at``. ``bulk_create(update_conflicts=True)``
+    can only overwrite ``quantity`` with the new value, not add to it.
+    """
+    table = connection.ops.quote_name(Inventory._meta.db_table)
+    acquired_at = Inventory._meta.get_field('acquired_at').get_db_prep_value(timezone.now(), connection)
+    rows = [(user.pk, vegetable_id, quantity, acquired_at) for vegetable_id, quantity in counts.items()]
+    
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} (user_id, vegetable_id, quantity, acquired_at) '
+            f'VALUES {", ".join(["(%s, %s, %s, %s)"] * len(rows))} '
+            f'ON CONFLICT (user_id, vegetable_id) DO UPDATE SET quantity = {table}.quantity + excluded.quantity '
+            f'RETURNING vegetable_id, id, quantity',
+            [value for row in rows for value in row],
+        )
+        return {vegetable_id: (pk, quantity) for vegetable_id, pk, quantity in cursor.fetchall()}
+
+def inventory_change(pk, vegetable_id, quantity, delta, price, entry, vegetable=None):
+    """
+    One changed inventory row, as responses and the ``inventory`` event carry
+    it. ``version`` is the id of the ledger entry written with the change: the
+    profile row lock serializes a user's writes, so later changes have higher
+    ids and a client can skip a change it has already applied.
+    """
+    change = {'id': pk, 'vegetable_id': vegetable_id, 'quantity': quantity, 'delta': delta, 'price': price, 'version': entry.pk}
+    if vegetable is not None:
+        change['vegetable'] = vegetable
+    return change
+
+def dropped_items(inventory_rows, counts, serialized, entry):
+    items = []
+    for vegetable_id, delta in counts.items():
+        pk, quantity = inventory_rows[vegetable_id]
+        items.append(inventory_change(pk, vegetable_id, quantity, delta, serialized[vegetable_id]['price'], entry, serialized[vegetable_id]))
+    return items
+
+def inventory_queryset(user, rarity=None):
+    # Rows sold down to zero are kept for the next drop (see compact_inventory).
+    queryset = Inventory.objects.filter(user_id=user.pk, quantity__gt=0).select_related('vegetable')
+    if rarity:
+        queryset = queryset.filter(vegetable__rarity=rarity)
+    return queryset
+
+INVENTORY_TOTALS = {
+    'total_items': Coalesce(Sum('quantity'), 0),
+    'total_value': Coalesce(Sum(F('quantity') * F('vegetable__price')), 0),
+}
 
 class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
@@ -21,23 +96,20 @@ class UserDetailView(generics.RetrieveAPIView):
     permission_classes = (IsAuthenticated,)
     serializer_class = UserSerializer
     
-    def get_object(self):
-        return self.request.user
+    def retrieve(self, request, *args, **kwargs):
+        return Response(get_state(request.user.pk)['user'])
 
 class ProfileViewSet(viewsets.GenericViewSet):
     permission_classes = (IsAuthenticated,)
     serializer_class = ProfileSerializer
-    
-    def get_object(self):
-        return self.request.user.profile
+    throttle_scopes = {'deposit': 'deposit'}
     
     def list(self, request):
-        serializer = self.get_serializer(self.get_object())
-        return Response(serializer.data)
+        return Response(get_state(request.user.pk)['profile'])
     
     @action(detail=False, methods=['post'])
+    @idempotent
     def deposit(self, request):
-        profile = self.get_object()
         amount = request.data.get('amount')
         
         try:
@@ -60,112 +132,395 @@ class ProfileViewSet(viewsets.GenericViewSet):
                 'message': 'Введите корректную сумму'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        profile.balance += amount
-        profile.save()
+        with transaction.atomic():
+            entry = credit(request.user, amount, 'deposit')
+            record_deposit(request.user.pk, amount)
+        
+        publish_balance(request.user.pk, entry.balance_after)
         
         return Response({
             'success': True,
             'message': f'Счет пополнен на {amount} монет',
-            'new_balance': profile.balance
+            'new_balance': entry.balance_after
         })
+    
+    @action(detail=False, methods=['get'])
+    def stats(self, request):
+        stats = UserStats.objects.filter(user_id=request.user.pk).first()
+        if stats is None:
+            if not User.objects.filter(pk=request.user.pk).exists():
+                raise UserNotFound
+            stats, _ = UserStats.objects.get_or_create(user_id=request.user.pk)
+        return Response(UserStatsSerializer(stats).data)
+
+class LeaderboardView(generics.GenericAPIView):
+    permission_classes = (AllowAny,)
+    
+    def get(self, request):
+        by = request.query_params.get('by', 'value')
+        
+        try:
+            limit = int(request.query_params.get('limit', 10))
+        except (TypeError, ValueError):
+            limit = 0
+        
+        if by not in LEADERBOARD_ORDERINGS or not 1 <= limit <= MAX_LEADERBOARD:
+            return Response({
+                'success': False,
+                'message': f'Параметры: by из {", ".join(LEADERBOARD_ORDERINGS)}, limit от 1 до {MAX_LEADERBOARD}'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response(get_leaderboard(by, limit))
+
+class EventTicketView(generics.GenericAPIView):
+    permission_classes = (IsAuthenticated,)
+    
+    def post(self, request):
+        return Response({
+            'ticket': issue_ticket(request.user.pk),
+            'expires_in': settings.EVENTS_TICKET_MAX_AGE
+        })
+
+class DropExportView(generics.GenericAPIView):
+    permission_classes = (IsAuthenticated,)
+    
+    def get(self, request):
+        # Not "format": DRF reserves it for renderer selection.
+        output = request.query_params.get('output', 'csv')
+        params = {name: request.query_params.get(name) or None for name in ('since', 'until', 'case')}
+        
+        try:
+            since = parse_datetime(params['since']) if params['since'] else None
+            until = parse_datetime(params['until']) if params['until'] else None
+            case_id = int(params['case']) if params['case'] else None
+            valid = (since is None) == (params['since'] is None) and (until is None) == (params['until'] is None)
+        except ValueError:
+            valid = False
+        
+        if output not in EXPORT_FORMATS or not valid:
+            return Response({
+                'success': False,
+                'message': f'Параметры: output из {", ".join(EXPORT_FORMATS)}, since и until в ISO 8601, case — id кейса'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        queryset = export_queryset(user_id=request.user.pk, case_id=case_id, since=since, until=until)
+        
+        # Django buffers a sync iterator under ASGI (and an async one under WSGI), so match the server.
+        if isinstance(request._request, ASGIRequest):
+            rows = aexport_rows(queryset, output)
+        else:
+            rows = export_rows(queryset, output)
+        
+        response = StreamingHttpResponse(rows, content_type=EXPORT_FORMATS[output])
+        response['Content-Disposition'] = f'attachment; filename="drops.{output}"'
+        return response
 
 class InventoryViewSet(viewsets.GenericViewSet):
     permission_classes = (IsAuthenticated,)
     serializer_class = InventorySerializer
+    pagination_class = InventoryCursorPagination
+    throttle_scopes = {'sell': 'sell', 'sell_batch': 'sell'}
     
     def get_queryset(self):
-        return Inventory.objects.filter(user=self.request.user).order_by('-acquired_at')
+        return inventory_queryset(self.request.user, self.request.query_params.get('rarity'))
     
     def list(self, request):
         queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        # The totals of the whole inventory come with the user's hot state (cases.hotstate).
+        if request.query_params.get('rarity'):
+            totals = queryset.aggregate(**INVENTORY_TOTALS)
+        else:
+            totals = get_state(request.user.pk)['totals']
+        
+        page = self.paginate_queryset(inventory_values(queryset))
+        response = self.get_paginated_response(inventory_rows(page))
+        response.data.update(totals)
+        return response
     
     @action(detail=True, methods=['post'])
+    @idempotent
     def sell(self, request, pk=None):
-        try:
-            inventory_item = Inventory.objects.get(id=pk, user=request.user)
-        except Inventory.DoesNotExist:
+        with transaction.atomic():
+            sold = Inventory.objects.filter(id=pk, user_id=request.user.pk, quantity__gte=1).update(quantity=F('quantity') - 1)
+            
+            if not sold:
+                return Response({
+                    'success': False,
+                    'message': 'Овощ не найден в инвентаре'
+                }, status=status.HTTP_404_NOT_FOUND)
+            
+            inventory_item = Inventory.objects.select_related('vegetable').get(id=pk)
+            price = inventory_item.vegetable.price
+            
+            if inventory_item.quantity > 0:
+                message = f'Продан {inventory_item.vegetable.name} за {price} монет. Осталось: {inventory_item.quantity}'
+            else:
+                message = f'Продан {inventory_item.vegetable.name} за {price} монет'
+            
+            entry = credit(request.user, price, 'sell')
+            record_sale(request.user.pk, [(inventory_item.vegetable.rarity, price, 1)])
+        
+        inventory = [inventory_change(inventory_item.id, inventory_item.vegetable_id, inventory_item.quantity, -1, price, entry)]
+        publish_balance(request.user.pk, entry.balance_after)
+        publish_inventory(request.user.pk, inventory)
+        
+        return Response({
+            'success': True,
+            'message': message,
+            'new_balance': entry.balance_after,
+            'inventory': inventory
+        })
+    
+    @action(detail=False, methods=['post'], url_path='sell-batch')
+    @idempotent
+    def sell_batch(self, request):
+        items = request.data.get('items')
+        rarity = request.data.get('rarity')
+        
+        if items is not None:
+            try:
+                requested = {}
+                for item in items:
+                    pk = int(item['id'])
+                    quantity = item.get('quantity', 1)
+                    # int() would quietly turn 1.5 into 1 and True into 1.
+                    if type(quantity) is not int or quantity <= 0 or pk in requested:
+                        raise ValueError
+                    requested[pk] = quantity
+            except (TypeError, ValueError, KeyError, AttributeError):
+                return Response({
+                    'success': False,
+                    'message': 'Некорректный список овощей'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            queryset = Inventory.objects.filter(user_id=request.user.pk, id__in=requested)
+        elif rarity:
+            requested = None
+            queryset = Inventory.objects.filter(user_id=request.user.pk, vegetable__rarity=rarity)
+        else:
             return Response({
                 'success': False,
-                'message': 'Овощ не найден в инвентаре'
-            }, status=status.HTTP_404_NOT_FOUND)
+                'message': 'Укажите овощи или редкость для продажи'
+            }, status=status.HTTP_400_BAD_REQUEST)
         
-        price = inventory_item.vegetable.price
-        profile = request.user.profile
-        profile.balance += price
-        profile.save()
+        with transaction.atomic():
+            rows = list(
+                queryset.filter(quantity__gt=0)
+                .select_for_update(of=('self',))
+                .values_list('id', 'quantity', 'vegetable_id', 'vegetable__price', 'vegetable__rarity')
+            )
+            
+            if requested is None:
+                requested = {pk: quantity for pk, quantity, vegetable_id, price, rarity in rows}
+            
+            available = {pk: quantity for pk, quantity, vegetable_id, price, rarity in rows}
+            if not rows or any(available.get(pk, 0) < quantity for pk, quantity in requested.items()):
+                return Response({
+                    'success': False,
+                    'message': 'Овощи не найдены в инвентаре'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            
+            sold = sum(requested.values())
+            payout = sum(requested[pk] * price for pk, quantity, vegetable_id, price, rarity in rows)
+            
+            Inventory.objects.filter(id__in=requested).update(
+                quantity=F('quantity') - CaseWhen(
+                    *[When(id=pk, then=Value(quantity)) for pk, quantity in requested.items()],
+                    default=Value(0),
+                )
+            )
+            
+            entry = credit(request.user, payout, 'sell')
+            record_sale(request.user.pk, [(rarity, price, requested[pk]) for pk, quantity, vegetable_id, price, rarity in rows])
         
-        if inventory_item.quantity > 1:
-            inventory_item.quantity -= 1
-            inventory_item.save()
-            message = f'Продан {inventory_item.vegetable.name} за {price} монет. Осталось: {inventory_item.quantity}'
-        else:
-            inventory_item.delete()
-            message = f'Продан {inventory_item.vegetable.name} за {price} монет'
+        inventory = [
+            inventory_change(pk, vegetable_id, quantity - requested[pk], -requested[pk], price, entry)
+            for pk, quantity, vegetable_id, price, rarity in rows
+        ]
+        publish_balance(request.user.pk, entry.balance_after)
+        publish_inventory(request.user.pk, inventory)
         
         return Response({
             'success': True,
-            'message': message,
-            'new_balance': profile.balance
+            'message': f'Продано {sold} овощей за {payout} монет',
+            'sold': sold,
+            'payout': payout,
+            'new_balance': entry.balance_after,
+            'inventory': inventory
         })
 
 class CaseViewSet(viewsets.ModelViewSet):
     queryset = Case.objects.filter(is_active=True)
     serializer_class = CaseSerializer
     permission_classes = (AllowAny,)
+    throttle_scopes = {'open': 'open', 'open_batch': 'open_batch'}
     
-    @action(detail=True, methods=['post'])
+    def list(self, request, *args, **kwargs):
+        return catalogue_response(request, get_catalogue())
+    
+    def retrieve(self, request, *args, **kwargs):
+        return Response(case_rows(self.get_queryset().filter(pk=self.get_object().pk))[0])
+    
+    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
+    @idempotent
     def open(self, request, pk=None):
         case = self.get_object()
         user = request.user
         
-        if user.profile.balance < case.price:
+        drop_table = get_drop_table(case)
+        
+        if not drop_table:
+            return Response({
+                'success': False,
+                'message': 'В кейсе нет овощей'
+            }, status=status.HTTP_404_NOT_FOUND)
+        
+        try:
+            with transaction.atomic():
+                entry = debit(user, case.price, 'open')
+                uniforms, proof = get_rng().draw(user, 1)
+                random_vegetable = drop_table.pick(uniforms)[0]
+                inventory_rows = add_to_inventory(user, {random_vegetable.id: 1})
+                record_open(user.pk, case.price, 1, [random_vegetable])
+                record_drops(user, case, [random_vegetable], proof)
+        except InsufficientFunds:
             return Response({
                 'success': False,
                 'message': 'Недостаточно средств на счете'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        vegetables = case.vegetables.all()
+        serializer = VegetableSerializer(random_vegetable)
+        inventory = dropped_items(inventory_rows, {random_vegetable.id: 1}, {random_vegetable.id: serializer.data}, entry)
+        
+        publish_balance(user.pk, entry.balance_after)
+        publish_inventory(user.pk, inventory)
+        publish_drops(user.username, case, [serializer.data])
         
-        if not vegetables.exists():
+        return Response({
+            'success': True,
+            'message': f'🎉 Открыли {case.name}!',
+            'reward': serializer.data,
+            'new_balance': entry.balance_after,
+            'inventory': inventory,
+            'fairness': proof
+        })
+    
+    @action(detail=True, methods=['post'], url_path='open-batch', permission_classes=[IsAuthenticated])
+    @idempotent
+    def open_batch(self, request, pk=None):
+        case = self.get_object()
+        user = request.user
+        
+        try:
+            count = int(request.data.get('count', 1))
+        except (TypeError, ValueError):
+            return Response({
+                'success': False,
+                'message': 'Введите корректное количество'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        if count <= 0 or count > MAX_BATCH_OPEN:
+            return Response({
+                'success': False,
+                'message': f'Можно открыть от 1 до {MAX_BATCH_OPEN} кейсов за раз'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        drop_table = get_drop_table(case)
+        
+        if not drop_table:
             return Response({
                 'success': False,
                 'message': 'В кейсе нет овощей'
             }, status=status.HTTP_404_NOT_FOUND)
         
-        RARITY_WEIGHTS = {
-            'common': 10,
-            'uncommon': 5,
-            'rare': 3,
-            'epic': 2,
-            'legendary': 1,
-        }
+        total_price = case.price * count
         
-        veg_list = list(vegetables)
-        weights = [RARITY_WEIGHTS[veg.rarity] for veg in veg_list]
+        try:
+            with transaction.atomic():
+                entry = debit(user, total_price, 'open')
+                uniforms, proof = get_rng().draw(user, count)
+                rewards = drop_table.pick(uniforms)
+                counts = Counter(veg.id for veg in rewards)
+                inventory_rows = add_to_inventory(user, counts)
+                record_open(user.pk, total_price, count, rewards)
+                record_drops(user, case, rewards, proof)
+        except InsufficientFunds:
+            return Response({
+                'success': False,
+                'message': 'Недостаточно средств на счете'
+            }, status=status.HTTP_400_BAD_REQUEST)
         
-        random_vegetable = random.choices(veg_list, weights=weights, k=1)[0]
+        serialized = {veg.id: VegetableSerializer(veg).data for veg in set(rewards)}
+        inventory = dropped_items(inventory_rows, counts, serialized, entry)
         
-        with transaction.atomic():
-            user.profile.balance -= case.price
-            user.profile.save()
-            
-            inventory_item, created = Inventory.objects.get_or_create(
-                user=user,
-                vegetable=random_vegetable,
-                defaults={'quantity': 1}
-            )
-            
-            if not created:
-                inventory_item.quantity += 1
-                inventory_item.save()
+        publish_balance(user.pk, entry.balance_after)
+        publish_inventory(user.pk, inventory)
+        publish_drops(user.username, case, [serialized[veg.id] for veg in rewards])
         
-        serializer = VegetableSerializer(random_vegetable)
+        return Response({
+            'success': True,
+            'message': f'🎉 Открыли {case.name} x{count}!',
+            'rewards': [serialized[veg.id] for veg in rewards],
+            'new_balance': entry.balance_after,
+            'inventory': inventory,
+            'fairness': proof
+        })
+
+class FairnessViewSet(viewsets.GenericViewSet):
+    permission_classes = (IsAuthenticated,)
+    serializer_class = SeedPairSerializer
+    
+    def list(self, request):
+        revealed = SeedPair.objects.filter(user_id=request.user.pk, revealed_at__isnull=False).order_by('-revealed_at')[:20]
+        return Response({
+            'active': SeedPairSerializer(active_seed_pair(request.user)).data,
+            'revealed': RevealedSeedPairSerializer(revealed, many=True).data
+        })
+    
+    @action(detail=False, methods=['post'])
+    def rotate(self, request):
+        client_seed = request.data.get('client_seed') or None
+        
+        if client_seed is not None and (not isinstance(client_seed, str) or len(client_seed) > 64):
+            return Response({
+                'success': False,
+                'message': 'Клиентский сид должен быть строкой до 64 символов'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        revealed, current = rotate_seed_pair(request.user, client_seed)
         
         return Response({
             'success': True,
-            'message': f'🎉 Открыли {case.name}!',
-            'reward': serializer.data,
-            'new_balance': user.profile.balance
-        })
\ No newline at end of file
+            'revealed': RevealedSeedPairSerializer(revealed).data,
+            'active': SeedPairSerializer(current).data
+        })
+    
+    @action(detail=False, methods=['get'], permission_classes=[AllowAny])
+    def verify(self, request):
+        server_seed = request.query_params.get('server_seed', '')
+        client_seed = request.query_params.get('client_seed', '')
+        
+        try:
+            nonce = int(request.query_params['nonce'])
+            count = int(request.query_params.get('count', 1))
+            case = Case.objects.get(pk=request.query_params['case'])
+        except (KeyError, TypeError, ValueError, Case.DoesNotExist):
+            return Response({
+                'success': False,
+                'message': 'Укажите server_seed, client_seed, nonce, count и case'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        drop_table = get_drop_table(case)
+        
+        if not server_seed or not client_seed or nonce < 0 or not 1 <= count <= MAX_BATCH_OPEN or not drop_table:
+            return Response({
+                'success': False,
+                'message': 'Некорректные параметры проверки'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Re-derived against the case's current contents; openings made before it was edited will differ.
+        rewards = drop_table.pick(derive_uniforms(server_seed, client_seed, nonce, count))
+        
+        return Response({
+            'server_seed_hash': hash_server_seed(server_seed),
+            'rewards': VegetableSerializer(rewards, many=True).data
+        })
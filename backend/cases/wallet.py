@@ -0,0 +1,48 @@
+from django.db import connection, transaction
+
+from .authentication import UserNotFound
+from .hotstate import state_changed
+from .models import LedgerEntry, Profile
+
+
+class InsufficientFunds(Exception):
+    pass
+
+
+def post_entry(user, amount, kind):
+    """
+    Change the user's balance by ``amount`` and append the matching ledger entry.
+
+    Debits are a single conditional UPDATE (``balance >= -amount``), so
+    concurrent writers never lose updates or overdraw; it also bumps the
+    profile's version and returns the new balance. Retried requests are
+    deduplicated before they get here, by ``cases.idempotency``.
+    """
+    table = connection.ops.quote_name(Profile._meta.db_table)
+    sql = f'UPDATE {table} SET balance = balance + %s, version = version + 1 WHERE user_id = %s'
+    params = [amount, user.pk]
+    if amount < 0:
+        sql += ' AND balance >= %s'
+        params.append(-amount)
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(f'{sql} RETURNING balance', params)
+            row = cursor.fetchone()
+
+        if row is None:
+            # Without a profile the token has outlived its user.
+            if amount >= 0 or not Profile.objects.filter(user_id=user.pk).exists():
+                raise UserNotFound
+            raise InsufficientFunds
+
+        state_changed(user.pk)
+        return LedgerEntry.objects.create(user_id=user.pk, kind=kind, amount=amount, balance_after=row[0])
+
+
+def credit(user, amount, kind):
+    return post_entry(user, amount, kind)
+
+
+def debit(user, amount, kind):
+    return post_entry(user, -amount, kind)
@@ -0,0 +1,15 @@
+import os
+
+# gunicorn reads ./gunicorn.conf.py by default; command-line flags override these values.
+
+# Import the application once in the master, so the workers are forked with
+# it loaded (and WhiteNoise's scan of STATIC_ROOT done) and share those pages.
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") == "1"
+
+
+def when_ready(server):
+    # Runs in the master before the first workers are forked.
+    if preload_app:
+        from kabachok_backend.warmup import warm_up
+
+        warm_up()
@@ -0,0 +1,168 @@
+import gzip
+import hashlib
+import os
+import re
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Vite names built assets "<name>-<8 character hash>.<ext>" under assetsDir.
+VITE_HASHED_ASSET = re.compile(r'^assets/.+-[\w-]{8}\.\w+$')
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise that stays on the event loop under ASGI, so API requests are
+    not pushed through a thread just to miss the static file lookup.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+
+        if static_file is not None:
+            return await sync_to_async(self.serve, thread_sensitive=False)(static_file, request)
+        return await self.get_response(request)
+
+    def immutable_file_test(self, path, url):
+        # Vite hashes its own output, which Django's manifest doesn't recognise as versioned.
+        if url.startswith(self.static_prefix) and VITE_HASHED_ASSET.match(url[len(self.static_prefix):]):
+            return True
+        return super().immutable_file_test(path, url)
+
+
+class SpaIndex:
+    """
+    ``index.html`` held in memory with gzip and (when the ``brotli`` package
+    is installed) brotli variants. The file's mtime is checked at most once
+    per ``check_interval`` seconds and the variants are rebuilt when it changes.
+    """
+
+    def __init__(self, path, check_interval=1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self.lock = threading.Lock()
+        self.mtime = None
+        self.checked_at = float('-inf')
+        self.variants = {}
+        self.etag = None
+
+    def get(self):
+        now = time.monotonic()
+        if now - self.checked_at >= self.check_interval:
+            with self.lock:
+                self.checked_at = now
+                try:
+                    mtime = os.stat(self.path).st_mtime_ns
+                except FileNotFoundError:
+                    mtime = None
+                if mtime != self.mtime:
+                    self.load(mtime)
+        return self.etag, self.variants
+
+    def load(self, mtime):
+        if mtime is None:
+            self.mtime, self.etag, self.variants = None, None, {}
+            return
+
+        with open(self.path, 'rb') as f:
+            content = f.read()
+        variants = {'identity': content}
+        compressed = {'gzip': gzip.compress(content, 9, mtime=0)}
+        if brotli is not None:
+            compressed['br'] = brotli.compress(content)
+        variants.update((encoding, body) for encoding, body in compressed.items() if len(body) < len(content))
+
+        self.mtime = mtime
+        self.etag = hashlib.sha1(content).hexdigest()[:20]
+        self.variants = variants
+
+
+class SpaIndexMiddleware:
+    """
+    Answers the frontend's client-side routes with the cached ``index.html``
+    before sessions, CSRF and URL resolution run. Paths under
+    ``SPA_EXCLUDED_PREFIXES`` (the API, the admin, static files) pass through.
+    The page is revalidated on every load (``no-cache``) so a deploy is picked
+    up immediately; an unchanged page costs a 304.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.index = SpaIndex(settings.SPA_INDEX_FILE)
+        self.excluded = tuple(settings.SPA_EXCLUDED_PREFIXES)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.serve(request) or self.get_response(request)
+
+    async def __acall__(self, request):
+        return self.serve(request) or await self.get_response(request)
+
+    def serve(self, request):
+        if request.method not in ('GET', 'HEAD') or request.path_info.startswith(self.excluded):
+            return None
+
+        etag, variants = self.index.get()
+        if etag is None:
+            return None
+
+        encoding = self.negotiate(request.headers.get('Accept-Encoding', ''), variants)
+        tag = f'"{etag}"' if encoding == 'identity' else f'"{etag}-{encoding}"'
+
+        if tag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(b'' if request.method == 'HEAD' else variants[encoding], content_type='text/html; charset=utf-8')
+            response['Content-Length'] = len(variants[encoding])
+            if encoding != 'identity':
+                response['Content-Encoding'] = encoding
+
+        response['ETag'] = tag
+        response['Cache-Control'] = 'no-cache'
+        # The response skips XFrameOptionsMiddleware, which sits further down the stack.
+        response['X-Frame-Options'] = getattr(settings, 'X_FRAME_OPTIONS', 'DENY').upper()
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
+    @staticmethod
+    def negotiate(accept_encoding, variants):
+        accepted = {token.split(';')[0].strip() for token in accept_encoding.lower().split(',')}
+        for encoding in ('br', 'gzip'):
+            if encoding in variants and encoding in accepted:
+                return encoding
+        return 'identity'
@@ -1,5 +1,7 @@
 from pathlib import Path
 from datetime import timedelta
+from urllib.parse import unquote, urlsplit
+from corsheaders.defaults import default_headers
 import os
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -28,7 +30,10 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "rest_framework_simplejwt.authentication.JWTStatelessUserAuthentication",
+    ),
+    "DEFAULT_THROTTLE_CLASSES": (
+        "cases.throttling.TokenBucketThrottle",
     ),
 }
 
@@ -39,7 +44,8 @@ SIMPLE_JWT = {
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
-    "whitenoise.middleware.WhiteNoiseMiddleware",
+    "kabachok_backend.middleware.AsyncWhiteNoiseMiddleware",
+    "kabachok_backend.middleware.SpaIndexMiddleware",
 
     "corsheaders.middleware.CorsMiddleware",
 
@@ -51,12 +57,85 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# API-only nodes leave out the admin and the session/message stack it needs; the API authenticates with JWTs.
+API_ONLY = os.environ.get("DJANGO_API_ONLY", "0") == "1"
+
+if API_ONLY:
+    for app in ("django.contrib.admin", "django.contrib.messages"):
+        INSTALLED_APPS.remove(app)
+    for middleware in (
+        "django.contrib.sessions.middleware.SessionMiddleware",
+        "django.contrib.auth.middleware.AuthenticationMiddleware",
+        "django.contrib.messages.middleware.MessageMiddleware",
+    ):
+        MIDDLEWARE.remove(middleware)
+
+# Serve the read endpoints from async views; enable when running under ASGI.
+ASYNC_READ_VIEWS = os.environ.get("DJANGO_ASYNC_VIEWS", "0") == "1"
+
+# Pub/sub backend behind /api/events/, which is only served with ASYNC_READ_VIEWS (the stream needs ASGI).
+# cases.events.InProcessBroker reaches subscribers in the same process only: use it with a single worker,
+# or cases.events.RedisBroker, shared by every process through EVENTS_REDIS_URL. Empty turns the events off.
+EVENTS_BACKEND = os.environ.get("EVENTS_BACKEND", "")
+EVENTS_REDIS_URL = os.environ.get("EVENTS_REDIS_URL", "redis://localhost:6379/0")
+EVENTS_ENABLED = ASYNC_READ_VIEWS and bool(EVENTS_BACKEND)
+EVENTS_HEARTBEAT = 15
+# Seconds a ticket from /api/events/ticket/ can open a stream; it travels in the URL, so it is short-lived.
+EVENTS_TICKET_MAX_AGE = 30
+
+LEADERBOARD_CACHE_TIMEOUT = 30
+
+# Source of randomness for case openings: cases.rng.CommitRevealRNG (verifiable) or cases.rng.SystemRNG.
+DROP_RNG_BACKEND = os.environ.get("DROP_RNG_BACKEND", "cases.rng.CommitRevealRNG")
+
+# Token buckets per throttle scope and user tier as (tokens per second, burst); None is unlimited.
+# "global" is one bucket shared by everyone. The tier comes from the JWT "tier" claim.
+THROTTLE_BUCKETS = {
+    "open": {"user": (5, 20), "staff": None, "global": (200, 400)},
+    "open_batch": {"user": (0.5, 5), "staff": None, "global": (20, 40)},
+    "deposit": {"user": (1, 10), "staff": None},
+    "sell": {"user": (10, 50), "staff": None},
+}
+# cases.throttling.LocalBucketStore (per process) or cases.throttling.CacheBucketStore (shared, uses THROTTLE_CACHE).
+THROTTLE_STORE = os.environ.get("THROTTLE_STORE", "cases.throttling.LocalBucketStore")
+THROTTLE_CACHE = "default"
+
+# Per-user hot state (balance, inventory totals) cached by cases.hotstate, spread over these cache
+# aliases by user id. The caches must be shared by every process (Redis, memcached), so it is off by default.
+HOTSTATE_CACHES = [alias for alias in os.environ.get("HOTSTATE_CACHES", "").split(",") if alias]
+# Compare every cached read with the database and log the entries that differ.
+HOTSTATE_CHECK = os.environ.get("HOTSTATE_CHECK", "0") == "1"
+
+# How long a response stored under an Idempotency-Key can be replayed (see purge_idempotency_keys).
+IDEMPOTENCY_KEY_TTL = timedelta(hours=24)
+
+# Deferred side effects (cases.jobs): cases.jobs.DatabaseQueue needs `manage.py run_worker`;
+# cases.jobs.ThreadPoolQueue runs them in-process, for development.
+JOBS_BACKEND = os.environ.get("JOBS_BACKEND", "cases.jobs.DatabaseQueue")
+JOBS_THREADS = 2
+JOBS_MAX_ATTEMPTS = 5
+
+# Drop history older than this is deleted by prune_drop_events.
+DROP_EVENT_RETENTION_DAYS = int(os.environ.get("DROP_EVENT_RETENTION_DAYS", "180"))
+
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "0") == "1"
+METRICS_QUERY_BUDGET = int(os.environ.get("METRICS_QUERY_BUDGET", "20"))
+# /api/metrics/ answers 403 to everyone while this is empty.
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
+if METRICS_ENABLED:
+    MIDDLEWARE.insert(0, "cases.metrics.QueryMetricsMiddleware")
+
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 
 STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 
+# The frontend's index.html, served by SpaIndexMiddleware for every path not under these prefixes.
+SPA_INDEX_FILE = os.path.join(STATIC_ROOT, 'index.html')
+SPA_EXCLUDED_PREFIXES = ('/api/', '/admin/', STATIC_URL)
+
 ROOT_URLCONF = "kabachok_backend.urls"
 
 TEMPLATES = [
@@ -68,7 +147,7 @@ TEMPLATES = [
             "context_processors": [
                 "django.template.context_processors.request",
                 "django.contrib.auth.context_processors.auth",
-                "django.contrib.messages.context_processors.messages",
+                *([] if API_ONLY else ["django.contrib.messages.context_processors.messages"]),
             ],
         },
     },
@@ -76,13 +155,63 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "kabachok_backend.wsgi.application"
 
-DATABASES = {
+DATABASE_URL = os.environ.get("DATABASE_URL", "")
+DB_POOL = os.environ.get("DB_POOL", "0") == "1"
+
+if DATABASE_URL:
+    url = urlsplit(DATABASE_URL)
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": url.path.lstrip("/"),
+            "USER": unquote(url.username or ""),
+            "PASSWORD": unquote(url.password or ""),
+            "HOST": url.hostname or "",
+            "PORT": url.port or "",
+            # Django's psycopg pool and persistent connections are mutually exclusive.
+            "CONN_MAX_AGE": 0 if DB_POOL else int(os.environ.get("DB_CONN_MAX_AGE", "60")),
+            "CONN_HEALTH_CHECKS": True,
+            "OPTIONS": {
+                "pool": {
+                    "min_size": int(os.environ.get("DB_POOL_MIN_SIZE", "2")),
+                    "max_size": int(os.environ.get("DB_POOL_MAX_SIZE", "10")),
+                    "timeout": 10,
+                },
+            } if DB_POOL else {},
+        }
+    }
+else:
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": os.environ.get(
+                "DJANGO_DB_PATH",
+                BASE_DIR / "db.sqlite3"
+            ),
+            "OPTIONS": {
+                "timeout": 20,
+                # Take the write lock at BEGIN so concurrent writers wait on
+                # busy_timeout instead of failing on a lock upgrade.
+                "transaction_mode": "IMMEDIATE",
+            },
+        }
+    }
+
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 20000,
+    "mmap_size": 256 * 1024 * 1024,
+    "temp_store": "MEMORY",
+}
+
+CACHES = {
     "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": os.environ.get(
-            "DJANGO_DB_PATH",
-            BASE_DIR / "db.sqlite3"
+        "BACKEND": os.environ.get(
+            "DJANGO_CACHE_BACKEND",
+            "django.core.cache.backends.locmem.LocMemCache"
         ),
+        "LOCATION": os.environ.get("DJANGO_CACHE_LOCATION", ""),
     }
 }
 
@@ -90,6 +219,7 @@ CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
     "http://127.0.0.1:3000",
 ]
+CORS_ALLOW_HEADERS = (*default_headers, "idempotency-key")
 
 AUTH_PASSWORD_VALIDATORS = [
     {
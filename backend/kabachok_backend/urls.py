@@ -1,20 +1,12 @@
-from django.contrib import admin
-from django.urls import path, include, re_path
 from django.conf import settings
-from django.conf.urls.static import static
-from django.http import HttpResponse
-import os
-
-def home(request):
-    file_path = os.path.join(settings.STATIC_ROOT, 'index.html')
-    with open(file_path, 'r') as f:
-        return HttpResponse(f.read())
+from django.urls import path, include
 
+# Every other path is the frontend's: kabachok_backend.middleware.SpaIndexMiddleware serves index.html.
 urlpatterns = [
-    path('admin/', admin.site.urls),
     path('api/', include('cases.urls')),
 ]
 
-urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
+if not settings.API_ONLY:
+    from django.contrib import admin
 
-urlpatterns += [re_path(r'^.*$', home)]
\ No newline at end of file
+    urlpatterns.append(path('admin/', admin.site.urls))
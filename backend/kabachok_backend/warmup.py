@@ -0,0 +1,42 @@
+import gc
+import logging
+
+from django.db import DatabaseError, connections
+from django.urls import get_resolver
+
+logger = logging.getLogger(__name__)
+
+
+def warm_up():
+    """
+    Fill per-process state in the gunicorn master before it forks the workers
+    (``preload_app``), so each worker starts with it instead of building its
+    own copy on its first requests: the URLconf and every view module, the
+    compiled drop tables and the rendered catalogue.
+    """
+    resolver = get_resolver()
+    resolver.url_patterns
+    resolver.reverse_dict
+
+    from cases.catalogue import get_catalogue
+    from cases.droptables import get_drop_table
+    from cases.models import Case
+
+    try:
+        for case in Case.objects.filter(is_active=True):
+            get_drop_table(case)
+        get_catalogue()
+    except DatabaseError:
+        # E.g. migrations not applied yet; the workers fill these on demand.
+        logger.warning("Warm-up skipped the database", exc_info=True)
+
+    # A socket (or a psycopg pool) opened here would be shared by every worker after the fork.
+    for connection in connections.all(initialized_only=True):
+        connection.close()
+        if hasattr(connection, 'close_pool'):
+            connection.close_pool()
+
+    # Keep the collector away from what is loaded so far: a collection in a
+    # worker writes to every object it visits and un-shares those pages.
+    gc.collect()
+    gc.freeze()
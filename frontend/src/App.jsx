@@ -1,5 +1,5 @@
-import { useState, useEffect } from 'react'
-import { casesAPI, profileAPI, authAPI, inventoryAPI } from './services/api' 
+import { useState, useEffect, useRef } from 'react'
+import { casesAPI, profileAPI, authAPI, inventoryAPI, eventsAPI } from './services/api' 
 import './App.css'
 
 function App() {
@@ -7,12 +7,19 @@ function App() {
   const [loading, setLoading] = useState(true)
   const [result, setResult] = useState(null)
   const [opening, setOpening] = useState(false)
+  // Пока запрос не вернулся, кнопки выключены: второй клик ушёл бы с новым Idempotency-Key и провёл операцию дважды
+  const [selling, setSelling] = useState(false)
+  const [depositing, setDepositing] = useState(false)
   const [isProfileOpen, setIsProfileOpen] = useState(false)
   const [user, setUser] = useState(null)
   const [balance, setBalance] = useState(0)
   const [isLogin, setIsLogin] = useState(true)
   const [inventory, setInventory] = useState([])
+  const [inventoryCursor, setInventoryCursor] = useState(null)
+  const [inventoryTotals, setInventoryTotals] = useState({ total_items: 0, total_value: 0 })
   const [loadingInventory, setLoadingInventory] = useState(false)
+  // id строки инвентаря -> { version, quantity } последнего учтённого изменения
+  const inventoryVersions = useRef(new Map())
   const [formData, setFormData] = useState({
     username: '',
     email: '',
@@ -24,6 +31,7 @@ function App() {
   const [activeTab, setActiveTab] = useState('menu')
   const [spinning, setSpinning] = useState(false)
   const [spinItems, setSpinItems] = useState([])
+  const [recentDrops, setRecentDrops] = useState([])
 
   useEffect(() => {
     const token = localStorage.getItem('access_token')
@@ -47,6 +55,42 @@ function App() {
     initAuth()
   }, [])
 
+  useEffect(() => {
+    if (!user) return
+
+    let source
+    let closed = false
+
+    const connect = async () => {
+      try {
+        source = await eventsAPI.subscribe({
+          balance: (event) => setBalance(event.balance),
+          inventory: (event) => applyInventoryChanges(event.items),
+          drop: (event) => setRecentDrops(prev => [event, ...prev].slice(0, 10))
+        })
+      } catch (error) {
+        // 404: события на сервере выключены
+        if (error.response?.status !== 404 && !closed) setTimeout(connect, 5000)
+        return
+      }
+      if (closed) {
+        source.close()
+        return
+      }
+      source.onerror = () => {
+        if (source.readyState !== EventSource.CLOSED) return
+        // Билет истёк: переподключаемся с новым
+        if (!closed) setTimeout(connect, 5000)
+      }
+    }
+
+    connect()
+    return () => {
+      closed = true
+      source?.close()
+    }
+  }, [user])
+
   const loadCases = async () => {
     try {
       const response = await casesAPI.getCases()
@@ -58,11 +102,61 @@ function App() {
     }
   }
 
+  const nextCursor = (next) => next ? new URL(next).searchParams.get('cursor') : null
+
+  const rememberInventory = (rows) => {
+    rows.forEach(row => {
+      const known = inventoryVersions.current.get(row.id)
+      inventoryVersions.current.set(row.id, { version: known?.version || 0, quantity: row.quantity })
+    })
+  }
+
+  // Изменение приходит и в ответе, и событием: применённое раньше (версия не больше известной) пропускаем
+  const applyInventoryChanges = (changes) => {
+    const fresh = changes.filter(change => {
+      const known = inventoryVersions.current.get(change.id)
+      return !known || change.version > known.version
+    })
+    if (fresh.length === 0) return
+
+    let items = 0
+    let value = 0
+    fresh.forEach(change => {
+      const known = inventoryVersions.current.get(change.id)
+      // Строка с другой страницы ещё не загружена: её прежнее количество неизвестно, берём дельту
+      const diff = known ? change.quantity - known.quantity : change.delta
+      items += diff
+      value += diff * change.price
+      inventoryVersions.current.set(change.id, { version: change.version, quantity: change.quantity })
+    })
+    setInventoryTotals(prev => ({
+      total_items: prev.total_items + items,
+      total_value: prev.total_value + value
+    }))
+
+    const byId = new Map(fresh.map(change => [change.id, change]))
+    setInventory(prev => {
+      const rows = prev
+        .map(row => byId.has(row.id) ? { ...row, quantity: byId.get(row.id).quantity } : row)
+        .filter(row => row.quantity > 0)
+      const added = fresh
+        .filter(change => change.vegetable && change.quantity > 0 && !prev.some(row => row.id === change.id))
+        .map(change => ({ id: change.id, vegetable: change.vegetable, quantity: change.quantity }))
+      return [...added, ...rows]
+    })
+  }
+
   const loadInventory = async () => {
     setLoadingInventory(true)
     try {
       const response = await inventoryAPI.getInventory()
-      setInventory(response.data)
+      rememberInventory(response.data.results)
+      setInventory(response.data.results)
+      setInventoryCursor(nextCursor(response.data.next))
+      setInventoryTotals({
+        total_items: response.data.total_items,
+        total_value: response.data.total_value
+      })
     } catch (error) {
       console.error('Ошибка загрузки инвентаря:', error)
     } finally {
@@ -70,11 +164,24 @@ function App() {
     }
   }
 
+  const loadMoreInventory = async () => {
+    try {
+      const response = await inventoryAPI.getInventory(inventoryCursor)
+      rememberInventory(response.data.results)
+      // Строка могла уже появиться сверху после выпадения
+      setInventory(prev => [...prev, ...response.data.results.filter(row => !prev.some(item => item.id === row.id))])
+      setInventoryCursor(nextCursor(response.data.next))
+    } catch (error) {
+      console.error('Ошибка загрузки инвентаря:', error)
+    }
+  }
+
   const handleSell = async (itemId) => {
+    setSelling(true)
     try {
       const response = await inventoryAPI.sellItem(itemId)
       setBalance(response.data.new_balance)
-      await loadInventory()
+      applyInventoryChanges(response.data.inventory)
       setResult({
         success: true,
         message: response.data.message
@@ -86,6 +193,8 @@ function App() {
         message: error.response?.data?.message || 'Ошибка при продаже'
       })
       setTimeout(() => setResult(null), 3000)
+    } finally {
+      setSelling(false)
     }
   }
 
@@ -149,6 +258,7 @@ function App() {
       setSpinning(false)
       setResult(response.data)
       setBalance(response.data.new_balance)
+      applyInventoryChanges(response.data.inventory)
     }, 3000)
   }, 100)
     
@@ -168,6 +278,7 @@ function App() {
       return
     }
 
+    setDepositing(true)
     try {
       const response = await profileAPI.deposit(amount)
       setBalance(response.data.new_balance)
@@ -175,6 +286,8 @@ function App() {
       setActiveTab('menu')
     } catch (error) {
       console.log('Ошибка пополнения:', error)
+    } finally {
+      setDepositing(false)
     }
   }
 
@@ -197,6 +310,9 @@ function App() {
     setIsProfileOpen(false)
     setActiveTab('menu')
     setInventory([])
+    setInventoryCursor(null)
+    setInventoryTotals({ total_items: 0, total_value: 0 })
+    inventoryVersions.current.clear()
   }
 
   const handleChange = (e) => {
@@ -345,9 +461,9 @@ function App() {
                 <div className="deposit-section">
                   <h3>Пополнить кошелек</h3>
                   <div className="deposit-presets">
-                    <button className="deposit-btn" onClick={() => handleDeposit(50)}>50</button>
-                    <button className="deposit-btn" onClick={() => handleDeposit(250)}>250</button>
-                    <button className="deposit-btn" onClick={() => handleDeposit(500)}>500</button>
+                    <button className="deposit-btn" onClick={() => handleDeposit(50)} disabled={depositing}>50</button>
+                    <button className="deposit-btn" onClick={() => handleDeposit(250)} disabled={depositing}>250</button>
+                    <button className="deposit-btn" onClick={() => handleDeposit(500)} disabled={depositing}>500</button>
                   </div>
                   <div className="deposit-custom">
                     <input
@@ -361,7 +477,7 @@ function App() {
                     <button 
                       className="deposit-btn custom"
                       onClick={() => handleDeposit(parseInt(customAmount))}
-                      disabled={!customAmount || parseInt(customAmount) <= 0 || parseInt(customAmount) > 5000}
+                      disabled={depositing || !customAmount || parseInt(customAmount) <= 0 || parseInt(customAmount) > 5000}
                     >
                       Пополнить
                     </button>
@@ -381,6 +497,9 @@ function App() {
                     </div>
                   ) : (
                     <div className="inventory-list">
+                      <div className="inventory-totals">
+                        Всего: {inventoryTotals.total_items} шт. на {inventoryTotals.total_value} 💰
+                      </div>
                       {inventory.map(item => (
                         <div key={item.id} className="inventory-item">
                           <div className="item-emoji">{item.vegetable.emoji}</div>
@@ -393,12 +512,17 @@ function App() {
                           </div>
                           <div className="item-price">
                             <div className="price-value">{item.vegetable.price} 💰</div>
-                            <button className="sell-button" onClick={() => handleSell(item.id)}>
+                            <button className="sell-button" onClick={() => handleSell(item.id)} disabled={selling}>
                               Продать
                             </button>
                           </div>
                         </div>
                       ))}
+                      {inventoryCursor && (
+                        <button className="sell-button" onClick={loadMoreInventory}>
+                          Показать ещё
+                        </button>
+                      )}
                     </div>
                   )}
                 </div>
@@ -449,6 +573,16 @@ function App() {
         </div>
       )}
 
+      {recentDrops.length > 0 && (
+        <div className="live-drops">
+          {recentDrops.map((drop, index) => (
+            <div key={index} className={`live-drop rarity-mini ${drop.vegetable.rarity}`}>
+              {drop.vegetable.emoji} {drop.vegetable.name} · {drop.username}
+            </div>
+          ))}
+        </div>
+      )}
+
       <div className="cases-grid">
         {cases.map(caseItem => (
           <div key={caseItem.id} className="case-card">
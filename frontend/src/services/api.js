@@ -42,6 +42,10 @@ api.interceptors.response.use(
   }
 )
 
+// A fresh key per user action; the refresh-and-retry above resends the same
+// config, so a replay is answered from the server's stored response.
+const idempotent = () => ({ headers: { 'Idempotency-Key': crypto.randomUUID() } })
+
 export const authAPI = {
   register: (data) => api.post('/auth/register/', data),
   login: (data) => api.post('/auth/login/', data),
@@ -51,18 +55,30 @@ export const authAPI = {
 
 export const profileAPI = {
   getProfile: () => api.get('/profile/'),
-  deposit: (amount) => api.post('/profile/deposit/', { amount }),
+  deposit: (amount) => api.post('/profile/deposit/', { amount }, idempotent()),
 }
 
 export const casesAPI = {
   getCases: () => api.get('/cases/'),
   getCaseById: (id) => api.get(`/cases/${id}/`),
-  openCase: (id) => api.post(`/cases/${id}/open/`),
+  openCase: (id) => api.post(`/cases/${id}/open/`, null, idempotent()),
 }
 
 export const inventoryAPI = {
-  getInventory: () => api.get('/inventory/'),
-  sellItem: (id) => api.post(`/inventory/${id}/sell/`),
+  getInventory: (cursor) => api.get('/inventory/', { params: cursor ? { cursor } : {} }),
+  sellItem: (id) => api.post(`/inventory/${id}/sell/`, null, idempotent()),
+}
+
+export const eventsAPI = {
+  // EventSource cannot send headers: the stream opens with a short-lived ticket, not the access token
+  subscribe: async (handlers) => {
+    const response = await api.post('/events/ticket/')
+    const source = new EventSource(`${API_URL}/events/?ticket=${encodeURIComponent(response.data.ticket)}`)
+    Object.entries(handlers).forEach(([type, handler]) => {
+      source.addEventListener(type, (event) => handler(JSON.parse(event.data)))
+    })
+    return source
+  },
 }
 
 export default api
\ No newline at end of file